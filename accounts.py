@@ -0,0 +1,44 @@
+ACCOUNTS_PAGE_LIMIT = 250  # Largest page the accounts endpoint returns
+IDLE_REFRESH_EVERY = 10  # Cycles between price checks for empty, disabled wallets
+
+
+class AccountSync:
+    def __init__(self, fetch_page, page_limit=ACCOUNTS_PAGE_LIMIT, idle_refresh_every=IDLE_REFRESH_EVERY):
+        self.fetch_page = fetch_page
+        self.page_limit = page_limit
+        self.idle_refresh_every = idle_refresh_every
+        self.balances = {}
+        self.cycle = 0
+
+    def fetch_all(self):
+        # Pages are chained by an opaque cursor, so they cannot be requested in parallel;
+        # the maximum page size keeps almost every portfolio to a single request
+        accounts = []
+        cursor = None
+        while True:
+            page = self.fetch_page(cursor=cursor, limit=self.page_limit)
+            accounts.extend(page.get('accounts', []))
+            cursor = page.get('cursor')
+            if not page.get('has_next') or not cursor:
+                return accounts
+
+    def sync(self):
+        accounts = self.fetch_all()
+        self.cycle += 1
+        balances = {}
+        changed = []
+        for account in accounts:
+            currency = account['currency']
+            balance = float(account['available_balance']['value'])
+            balances[currency] = balance
+            if self.balances.get(currency) != balance:
+                changed.append(account)
+        self.balances = balances
+        return accounts, changed
+
+    def is_due(self, currency, enabled=False):
+        # Wallets that are enabled or hold a balance are refreshed every cycle; empty,
+        # disabled ones only every idle_refresh_every cycles
+        if enabled or self.balances.get(currency, 0) > 0:
+            return True
+        return (self.cycle - 1) % self.idle_refresh_every == 0
@@ -0,0 +1,226 @@
+import argparse
+import csv
+import time
+import numpy as np
+from pathlib import Path
+from config import load_strategy_settings
+from history import PriceHistory, TICK_DTYPE, Series
+from products import ProductCatalog
+from strategy import SHORT_WINDOW, LONG_WINDOW, trend_up, sell_mask, floor_to_increment
+
+DEFAULT_BASE_INCREMENT = 1e-8
+SEARCH_CHUNK = 1024  # First slice scanned for an exit; doubles until one is found
+
+
+def _tick_prices(records):
+    return np.where(np.isnan(records['bid']), records['last'], records['bid'])
+
+
+def load_prices(path):
+    path = Path(path)
+    if path.suffix == ".ticks":
+        records = Series(path, dtype=TICK_DTYPE).all()
+        return np.array(records['timestamp']), _tick_prices(records)
+    if path.suffix == ".npy":
+        data = np.load(path, mmap_mode='r')
+        return data[:, 0], data[:, 1]
+
+    # CSV with a header: a timestamp column plus one of close/price/last/bid
+    with open(path, "r") as f:
+        header = [column.strip().lower() for column in f.readline().split(",")]
+    time_column = next(i for i, name in enumerate(header) if name in ('timestamp', 'time', 'start'))
+    price_column = next(i for i, name in enumerate(header) if name in ('close', 'price', 'last', 'bid'))
+    data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=(time_column, price_column), ndmin=2)
+    return data[:, 0], data[:, 1]
+
+
+def load_directory(directory, product_ids=None):
+    directory = Path(directory)
+    series = {}
+    for path in sorted(directory.iterdir()):
+        if path.suffix not in (".ticks", ".npy", ".csv"):
+            continue
+        product_id = path.stem
+        if product_ids and product_id not in product_ids:
+            continue
+        timestamps, prices = load_prices(path)
+        valid = ~np.isnan(prices)
+        series[product_id] = (timestamps[valid], prices[valid])
+    return series
+
+
+def _find_exit(prices, up, entry, entry_price, sale_threshold, loss_limit):
+    start = entry + 1
+    chunk = SEARCH_CHUNK
+    while start < len(prices):
+        end = min(start + chunk, len(prices))
+        hits = np.flatnonzero(sell_mask(prices[start:end], entry_price, up[start:end], sale_threshold, loss_limit))
+        if len(hits):
+            return start + hits[0]
+        start = end
+        chunk *= 2
+    return None
+
+
+def run_backtest(timestamps, prices, sale_threshold=10, loss_limit=5, transaction_fee=0.5, usd_order_size=100,
+                 base_increment=DEFAULT_BASE_INCREMENT, short_window=SHORT_WINDOW, long_window=LONG_WINDOW):
+    prices = np.asarray(prices, dtype=float)
+    up = trend_up(prices, short_window, long_window)
+    fee = transaction_fee / 100
+
+    # One position at a time: buy when flat, sell on the sale_threshold/loss_limit rules.
+    # The live bot keeps adding a buy every buy_interval up to max_position_usd, so this
+    # matches it only with max_position_usd set to the order size. The Python loop here
+    # runs once per trade and every scan between an entry and its exit is a NumPy operation
+    entries, exits = [], []
+    still_open = False
+    entry = 0
+    while entry < len(prices) - 1:
+        exit_index = _find_exit(prices, up, entry, prices[entry], sale_threshold, loss_limit)
+        entries.append(entry)
+        if exit_index is None:
+            # Still open at the end of the data, marked to market at the last price
+            exits.append(len(prices) - 1)
+            still_open = True
+            break
+        exits.append(exit_index)
+        entry = exit_index + 1
+
+    entries = np.array(entries, dtype=np.int64)
+    exits = np.array(exits, dtype=np.int64)
+    closed = np.ones(len(entries), dtype=bool)
+    if still_open:
+        closed[-1] = False
+
+    entry_prices = prices[entries]
+    exit_prices = prices[exits]
+    sizes = floor_to_increment(usd_order_size / entry_prices, base_increment)
+    costs = sizes * entry_prices * (1 + fee)
+    proceeds = sizes * exit_prices * (1 - np.where(closed, fee, 0.0))
+    pnl = proceeds - costs
+
+    # Equity relative to the starting order size: realised PnL plus the open position's value
+    position = np.zeros(len(prices))
+    cost_basis = np.zeros(len(prices))
+    realised = np.zeros(len(prices))
+    for index in range(len(entries)):
+        held = slice(entries[index], exits[index] + (0 if closed[index] else 1))
+        position[held] = sizes[index]
+        cost_basis[held] = costs[index]
+        if closed[index]:
+            realised[exits[index]] += pnl[index]
+    equity = np.cumsum(realised) + position * prices - cost_basis
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+
+    return {
+        'timestamps': np.asarray(timestamps),
+        'equity': equity,
+        'pnl': float(pnl.sum()),
+        'realised_pnl': float(pnl[closed].sum()),
+        'max_drawdown': float(drawdown.max()) if len(drawdown) else 0.0,
+        'trades': int(closed.sum()),
+        'wins': int((pnl[closed] > 0).sum()),
+        'fees': float((sizes * entry_prices * fee + sizes * exit_prices * np.where(closed, fee, 0.0)).sum()),
+        'fills': {
+            'entry_time': np.asarray(timestamps)[entries],
+            'entry_price': entry_prices,
+            'exit_time': np.asarray(timestamps)[exits],
+            'exit_price': exit_prices,
+            'size': sizes,
+            'pnl': pnl,
+            'closed': closed,
+        },
+    }
+
+
+def portfolio_equity(results):
+    # Sum per-product equity on the union of all timestamps, carrying each value forward
+    if not results:
+        return np.array([]), np.array([])
+    timeline = np.unique(np.concatenate([result['timestamps'] for result in results.values()]))
+    total = np.zeros(len(timeline))
+    for result in results.values():
+        positions = np.searchsorted(result['timestamps'], timeline, side='right') - 1
+        total += np.where(positions >= 0, result['equity'][np.maximum(positions, 0)], 0.0)
+    return timeline, total
+
+
+def backtest_portfolio(series, catalog=None, **parameters):
+    results = {}
+    for product_id, (timestamps, prices) in series.items():
+        product = catalog.peek(product_id) if catalog else None
+        increment = float(product['base_increment']) if product and product.get('base_increment') \
+            else DEFAULT_BASE_INCREMENT
+        results[product_id] = run_backtest(timestamps, prices, base_increment=increment, **parameters)
+    return results
+
+
+def summarize(results):
+    timeline, equity = portfolio_equity(results)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity if len(equity) else np.array([0.0])
+    trades = sum(result['trades'] for result in results.values())
+    wins = sum(result['wins'] for result in results.values())
+    return {
+        'products': len(results),
+        'pnl': sum(result['pnl'] for result in results.values()),
+        'realised_pnl': sum(result['realised_pnl'] for result in results.values()),
+        'fees': sum(result['fees'] for result in results.values()),
+        'trades': trades,
+        'win_rate': wins / trades if trades else 0.0,
+        'max_drawdown': float(drawdown.max()),
+    }
+
+
+def write_fills(results, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(['product_id', 'entry_time', 'entry_price', 'exit_time', 'exit_price', 'size', 'pnl', 'closed'])
+        for product_id, result in results.items():
+            fills = result['fills']
+            for row in zip(*(fills[key] for key in ('entry_time', 'entry_price', 'exit_time', 'exit_price',
+                                                    'size', 'pnl', 'closed'))):
+                writer.writerow([product_id, *row])
+
+
+def main():
+    strategy_settings = load_strategy_settings()
+    parser = argparse.ArgumentParser(description="Replay stored prices through the buy/sell rules")
+    parser.add_argument("data", nargs="?", default=str(PriceHistory().directory),
+                        help="Directory of <product_id>.ticks/.csv/.npy files (default: data/history)")
+    parser.add_argument("--products", nargs="*", help="Only these product IDs")
+    parser.add_argument("--sale-threshold", type=float, default=strategy_settings['sale_threshold'])
+    parser.add_argument("--loss-limit", type=float, default=strategy_settings['loss_limit'])
+    parser.add_argument("--fee", type=float, default=strategy_settings['transaction_fee'],
+                        help="Transaction fee percentage per fill")
+    parser.add_argument("--order-size", type=float, default=100, help="USD spent per buy")
+    parser.add_argument("--short-window", type=int, default=SHORT_WINDOW)
+    parser.add_argument("--long-window", type=int, default=LONG_WINDOW)
+    parser.add_argument("--fills", help="Write every fill to this CSV file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    series = load_directory(args.data, args.products)
+    loaded = time.perf_counter()
+    results = backtest_portfolio(series, catalog=ProductCatalog(None), sale_threshold=args.sale_threshold,
+                                 loss_limit=args.loss_limit, transaction_fee=args.fee,
+                                 usd_order_size=args.order_size, short_window=args.short_window,
+                                 long_window=args.long_window)
+    finished = time.perf_counter()
+
+    print(f"{'Product':<14}{'Points':>10}{'Trades':>8}{'PnL (USD)':>14}{'Max DD':>12}")
+    for product_id, result in results.items():
+        print(f"{product_id:<14}{len(result['equity']):>10}{result['trades']:>8}"
+              f"{result['pnl']:>14.2f}{result['max_drawdown']:>12.2f}")
+    summary = summarize(results)
+    print(f"\nTotal PnL: {summary['pnl']:.2f} USD (realised {summary['realised_pnl']:.2f}, fees {summary['fees']:.2f})")
+    print(f"Trades: {summary['trades']}, win rate {summary['win_rate']:.1%}")
+    print(f"Portfolio max drawdown: {summary['max_drawdown']:.2f} USD")
+    print(f"Loaded in {loaded - started:.2f}s, simulated in {finished - loaded:.2f}s")
+
+    if args.fills:
+        write_fills(results, args.fills)
+        print(f"Fills written to {args.fills}")
+
+
+if __name__ == "__main__":
+    main()
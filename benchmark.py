@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+import yaml
+from pathlib import Path
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from simulator import ExchangeSimulator
+from metrics import registry, SamplingProfiler
+
+DEFAULT_COIN_COUNTS = [1, 10, 50, 100, 500]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def prepare_workdir(host, rate_limit):
+    # The bot reads settings/ and data/ relative to the working directory, so the
+    # benchmark runs in a scratch directory with a throwaway signing key
+    workdir = Path(tempfile.mkdtemp(prefix="autocoin-bench-"))
+    (workdir / "settings").mkdir()
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL,
+                            serialization.NoEncryption()).decode()
+    settings = {
+        'key_name': "organizations/benchmark/apiKeys/benchmark",
+        'key_secret': pem.replace("\n", "\\n"),
+        'request_host': host,
+        'request_scheme': "http",
+        'accounts_path': "/api/v3/brokerage/accounts",
+        'prices_path': "/api/v3/brokerage/products/{product_id}/ticker",
+        'orders_path': "/api/v3/brokerage/orders",
+        'spend_account': "USD",
+        'refresh_interval': 60,
+        'transaction_fee': 0.5,
+        'sale_threshold': 10,
+        'loss_limit': 5,
+        'buy_interval': 0,  # Every cycle places its orders, so cycles stay comparable
+        'max_position_usd': 0,
+        'private_rate_limit': rate_limit,
+        'public_rate_limit': rate_limit,
+    }
+    with open(workdir / "settings" / "settings.yaml", "w") as f:
+        yaml.dump(settings, f, sort_keys=False)
+    with open(workdir / "settings" / "coins_settings.yaml", "w") as f:
+        yaml.dump({}, f)
+    os.chdir(workdir)
+    return workdir, settings
+
+
+async def run_cycle(modules, client, settings):
+    main, trading, store = modules
+    await main.refresh_balances_and_prices(client, settings)
+    product_ids = [f"{coin}-USD" for coin in store.enabled_coins()]
+    quotes = await trading.poll_prices(client, product_ids)
+    await trading.evaluate(client, quotes, settings)
+
+
+def benchmark(simulator, modules, settings, coins, cycles, allocations):
+    coinbase = importlib.import_module("coinbase")
+    store = modules[-1]
+    simulator.reset(coins)
+    coinbase.get_product_catalog().refresh()
+
+    order_latencies = []
+
+    class TimedClient(coinbase.AsyncCoinbaseClient):
+        async def place_market_order(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await super().place_market_order(*args, **kwargs)
+            finally:
+                order_latencies.append(time.perf_counter() - started)
+
+    async def measure():
+        client = TimedClient()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await modules[0].refresh_balances_and_prices(client, settings)
+        # Only coins the account listing returned exist in the bot's state
+        for coin in store.coins():
+            if f"{coin}-USD" in simulator.products:
+                store.update(coin, enabled=True)
+
+        simulator.requests.clear()
+        registry.reset()
+        order_latencies.clear()
+        wall_times, peaks = [], []
+        for _ in range(cycles):
+            if allocations:
+                tracemalloc.start()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                await run_cycle(modules, client, settings)
+            wall_times.append(time.perf_counter() - started)
+            if allocations:
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        return wall_times, peaks
+
+    wall_times, peaks = asyncio.run(measure())
+    requests = sum(simulator.requests.values())
+    return {
+        'coins': coins,
+        'cycles': cycles,
+        'cycle_mean_s': statistics.mean(wall_times),
+        'cycle_p50_s': percentile(wall_times, 0.5),
+        'cycle_max_s': max(wall_times),
+        'requests_per_cycle': requests / cycles,
+        'requests_by_endpoint': {endpoint: count / cycles for endpoint, count in simulator.requests.items()},
+        'orders': len(order_latencies),
+        'order_p50_ms': percentile(order_latencies, 0.5) * 1000,
+        'order_p99_ms': percentile(order_latencies, 0.99) * 1000,
+        'peak_alloc_kib': max(peaks) / 1024 if peaks else None,
+        'client': coinbase.get_client().connection_stats(),
+        'rate_limit': coinbase.get_client().rate_limit_stats(),
+        'timings': registry.snapshot()['histograms'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure trading-cycle latency and throughput against the simulator")
+    parser.add_argument("--coins", type=int, nargs="*", default=DEFAULT_COIN_COUNTS)
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--server-rate-limit", type=int, help="Simulated exchange limit in requests/second")
+    parser.add_argument("--client-rate-limit", type=float, default=10000,
+                        help="Client-side limiter rate; use 30 to measure under Coinbase's real limit")
+    parser.add_argument("--allocations", action="store_true", help="Track peak allocations per cycle (slower)")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--profile", help="Sample stacks for the whole run and write them to this file")
+    args = parser.parse_args()
+
+    output = Path(args.json).resolve() if args.json else None
+    profile = Path(args.profile).resolve() if args.profile else None
+    simulator = ExchangeSimulator(coins=max(args.coins), latency=args.latency, latency_jitter=args.latency_jitter,
+                                  error_rate=args.error_rate, rate_limit=args.server_rate_limit, seed=1).start()
+    workdir, settings = prepare_workdir(simulator.host, args.client_rate_limit)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        main_module = importlib.import_module("main")
+    modules = (
+        main_module,
+        importlib.import_module("trading"),
+        importlib.import_module("state").store,
+    )
+
+    print(f"Working directory: {workdir}")
+    print(f"{'Coins':>6}{'Cycle mean':>12}{'p50':>9}{'max':>9}{'Req/cycle':>11}{'Orders':>8}"
+          f"{'Order p50':>11}{'p99':>9}{'Peak KiB':>10}")
+    results = []
+    profiler = SamplingProfiler(profile).start() if profile else None
+    for coins in sorted(args.coins):
+        result = benchmark(simulator, modules, settings, coins, args.cycles, args.allocations)
+        results.append(result)
+        peak = f"{result['peak_alloc_kib']:.0f}" if result['peak_alloc_kib'] is not None else "-"
+        print(f"{coins:>6}{result['cycle_mean_s']:>11.3f}s{result['cycle_p50_s']:>8.3f}s{result['cycle_max_s']:>8.3f}s"
+              f"{result['requests_per_cycle']:>11.1f}{result['orders']:>8}{result['order_p50_ms']:>9.1f}ms"
+              f"{result['order_p99_ms']:>7.1f}ms{peak:>10}")
+    simulator.stop()
+    if profiler:
+        profiler.stop()
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,32 @@
-from coinbase import get_current_price, place_market_order
-from config import load_coins_settings, update_coins_settings
+import time
+from coinbase import quote_price
+from state import store
+from orders import order_tracker
 
-def buy_coin(coin, usd_order_size):
-    current_price = get_current_price(f"{coin}-USD")
+BUY_INTERVAL = 60  # Minimum seconds between buys of the same coin
+
+
+async def buy_coin(client, coin, usd_order_size, current_price=None, buy_interval=BUY_INTERVAL, budget=None):
+    if order_tracker.has_open(coin, 'BUY'):
+        return  # The last buy has not settled yet
+    # Prices may be polled every few seconds near a threshold; buys keep their own pace
+    if time.time() - store.get(coin, {}).get('last_buy_time', 0) < buy_interval:
+        return
+    if current_price is None:
+        current_price = quote_price((await client.get_price_snapshot([f"{coin}-USD"])).get(f"{coin}-USD"))
     if current_price is None:
         print(f"Could not fetch current price for {coin}. Skipping buy.")
         return
+    # Failed attempts count too, so a rejected buy is not retried on every price event
+    if budget is not None and budget.take(time.monotonic()):
+        return
 
-    base_size = usd_order_size / current_price
-
-    success, order_id, error = place_market_order(f"{coin}-USD", 'BUY', usd_order_size=usd_order_size)
+    success, order_id, error = await client.place_market_order(f"{coin}-USD", 'BUY', usd_order_size=usd_order_size,
+                                                               current_price=current_price)
     if success:
         print(f"Buy order placed successfully for {coin}, order ID: {order_id}")
-        coins_settings = load_coins_settings()
-        coins_settings[coin]['balance'] += base_size
-        coins_settings[coin]['current_cost_usd'] = current_price
-        update_coins_settings(coins_settings)
+        # Balance and cost basis are updated from the actual fill once the order settles
+        order_tracker.track(order_id, f"{coin}-USD", 'BUY', coin)
+        store.update(coin, last_buy_time=time.time())
     else:
         print(f"Failed to place buy order for {coin}: {error}")
-
-def check_buy_opportunities():
-    coins_settings = load_coins_settings()
-    for coin, coin_settings in coins_settings.items():
-        if coin_settings['enabled'] and coin_settings['current_price'] != "N/A":
-            buy_coin(coin, usd_order_size=100)  # Example buy amount
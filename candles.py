@@ -0,0 +1,209 @@
+import argparse
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from history import history, PriceHistory, CANDLE_DTYPE
+from coinbase import make_request, quote_price
+from ratelimit import PRIORITY_BACKFILL
+
+CANDLES_PATH = "/api/v3/brokerage/products/{product_id}/candles"
+MAX_CANDLES = 350  # Coinbase rejects candle requests spanning more buckets than this
+BACKFILL_WORKERS = 8  # Concurrent products; the client's rate limiter still caps the request rate
+
+# Local name -> (Coinbase granularity, seconds per candle)
+GRANULARITIES = {
+    '1m': ("ONE_MINUTE", 60),
+    '5m': ("FIVE_MINUTE", 300),
+    '15m': ("FIFTEEN_MINUTE", 900),
+    '1h': ("ONE_HOUR", 3600),
+    '6h': ("SIX_HOUR", 21600),
+    '1d': ("ONE_DAY", 86400),
+}
+DEFAULT_GRANULARITIES = ("1m", "5m", "1h")
+
+_stores = {}
+_stores_lock = threading.Lock()
+# Bucket starts the exchange returned no candle for, per series file; a bucket with no
+# trades never gets one, so these are not asked for again
+_empty = {}
+_empty_lock = threading.Lock()
+
+
+def candle_store(granularity):
+    # Candles live next to the tick history, so a shard's candles follow its history directory
+    store = _stores.get(granularity)
+    if store is None or store.directory != history.directory / "candles":
+        with _stores_lock:
+            store = _stores[granularity] = PriceHistory(history.directory / "candles", dtype=CANDLE_DTYPE,
+                                                        suffix=f".{granularity}.candles")
+    return store
+
+
+class CandleAggregator:
+    # Rolls quotes into OHLC candles per product and granularity; a candle is written
+    # once its bucket has passed. The first bucket after a start only saw part of its
+    # ticks, so it is left out; the next backfill finds the gap and fetches it complete.
+    def __init__(self, granularities=DEFAULT_GRANULARITIES, store_for=candle_store):
+        self.store_for = store_for
+        self.candles = {}
+        self.stats = {'written': 0, 'skipped': 0}
+        self.set_granularities(granularities)
+
+    def set_granularities(self, granularities):
+        self.granularities = {name: GRANULARITIES[name][1] for name in granularities}
+        self.candles = {key: candle for key, candle in self.candles.items() if key[1] in self.granularities}
+
+    def add(self, product_id, price, timestamp, volume=0.0):
+        for name, seconds in self.granularities.items():
+            start = timestamp - timestamp % seconds
+            key = (product_id, name)
+            candle = self.candles.get(key)
+            if candle is None:
+                self.candles[key] = {'start': start, 'open': price, 'high': price, 'low': price, 'close': price,
+                                     'volume': volume, 'partial': True}
+            elif start > candle['start']:
+                self._write(product_id, name, candle)
+                self.candles[key] = {'start': start, 'open': price, 'high': price, 'low': price, 'close': price,
+                                     'volume': volume, 'partial': False}
+            elif start == candle['start']:
+                candle['high'] = max(candle['high'], price)
+                candle['low'] = min(candle['low'], price)
+                candle['close'] = price
+                candle['volume'] += volume
+
+    def add_quotes(self, quotes):
+        for product_id, quote in quotes.items():
+            price = quote_price(quote)
+            if price is not None:
+                self.add(product_id, price, quote.get('time') or time.time())
+
+    def _write(self, product_id, name, candle):
+        series = self.store_for(name).series(product_id)
+        last = series.last_timestamp()
+        if candle['partial'] or (last is not None and last >= candle['start']):
+            self.stats['skipped'] += 1  # Incomplete, or the backfill already stored this bucket
+            return
+        series.append(candle['start'], candle['open'], candle['high'], candle['low'], candle['close'],
+                      candle['volume'])
+        self.stats['written'] += 1
+
+
+aggregator = CandleAggregator()
+
+
+def fetch_candles(product_id, start, end, granularity):
+    # Candles with a bucket start in [start, end), oldest first
+    name, _ = GRANULARITIES[granularity]
+    path = CANDLES_PATH.format(product_id=product_id)
+    response = make_request(f"{path}?start={int(start)}&end={int(end) - 1}&granularity={name}",
+                            priority=PRIORITY_BACKFILL)
+    rows = [(float(candle['start']), float(candle['open']), float(candle['high']), float(candle['low']),
+             float(candle['close']), float(candle['volume'])) for candle in response.get('candles', [])]
+    candles = np.array(rows, dtype=CANDLE_DTYPE)
+    candles = candles[(candles['timestamp'] >= start) & (candles['timestamp'] < end)]
+    return np.sort(candles, order='timestamp')
+
+
+def missing_ranges(timestamps, start, end, seconds):
+    # [from, to) spans of bucket starts between start and end with no stored candle
+    stored = timestamps[(timestamps >= start) & (timestamps < end)]
+    edges = np.concatenate([[start - seconds], stored, [end]])
+    gaps = np.flatnonzero(np.diff(edges) > seconds)
+    return [(float(edges[index] + seconds), float(edges[index + 1])) for index in gaps]
+
+
+def request_windows(ranges, seconds, size=MAX_CANDLES):
+    # Packs missing spans into [from, to) requests of at most size buckets, so scattered
+    # short gaps share one request instead of costing one each
+    windows = []
+    for start, stop in ranges:
+        while start < stop:
+            if windows and start < windows[-1][0] + size * seconds:
+                window_start = windows.pop()[0]
+            else:
+                window_start = start
+            chunk_end = min(stop, window_start + size * seconds)
+            windows.append((window_start, chunk_end))
+            start = chunk_end
+    return windows
+
+
+def backfill_product(product_id, granularity, since, now=None):
+    # Fetches every bucket between since and the last completed one that is not stored
+    # yet: the time before the first candle, downtime between runs, the partial bucket
+    # the aggregator skipped at a start, and whatever an interrupted run did not reach.
+    # Buckets without trades have no candle; once settled they are remembered as empty.
+    seconds = GRANULARITIES[granularity][1]
+    now = time.time() if now is None else now
+    end = now - now % seconds
+    since -= since % seconds
+    series = candle_store(granularity).series(product_id)
+    with _empty_lock:
+        empty = _empty.get(series.path, np.empty(0))
+        empty = empty[empty >= since]
+
+    def gaps():
+        return missing_ranges(np.union1d(series.all()['timestamp'], empty), since, end, seconds)
+
+    written = 0
+    for start, stop in request_windows(gaps(), seconds):
+        candles = fetch_candles(product_id, start, stop, granularity)
+        if len(candles):
+            written += series.merge(candles)
+    series.flush()
+
+    # Everything still missing was asked for and came back empty. The newest bucket may
+    # just not be published yet, so it is left for the next run.
+    settled = end - seconds
+    unfilled = [np.arange(start, min(stop, settled), seconds) for start, stop in gaps() if start < settled]
+    with _empty_lock:
+        _empty[series.path] = np.union1d(empty, np.concatenate([empty[:0], *unfilled]))
+    return written
+
+
+def backfill(product_ids, granularities=DEFAULT_GRANULARITIES, days=None, points=MAX_CANDLES,
+             workers=BACKFILL_WORKERS):
+    # Looks back days, or else points candles, per granularity; products run concurrently
+    now = time.time()
+    jobs = {}
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for granularity in granularities:
+            lookback = days * 86400 if days else points * GRANULARITIES[granularity][1]
+            for product_id in product_ids:
+                jobs[executor.submit(backfill_product, product_id, granularity, now - lookback, now)] = \
+                    (product_id, granularity)
+        for future in as_completed(jobs):
+            product_id, granularity = jobs[future]
+            try:
+                results[(product_id, granularity)] = future.result()
+            except Exception as e:
+                print(f"Error backfilling {granularity} candles for {product_id}: {e}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download historical candles into the local history store")
+    parser.add_argument("--products", nargs="*", help="Product IDs, defaults to every enabled coin")
+    parser.add_argument("--granularity", nargs="*", default=list(DEFAULT_GRANULARITIES), choices=list(GRANULARITIES))
+    parser.add_argument("--days", type=float, default=30, help="How far back to start when nothing is stored yet")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    args = parser.parse_args()
+
+    product_ids = args.products
+    if not product_ids:
+        from state import store
+        product_ids = [f"{coin}-USD" for coin in store.enabled_coins()]
+
+    started = time.perf_counter()
+    results = backfill(product_ids, args.granularity, days=args.days, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    for granularity in args.granularity:
+        count = sum(written for (_, name), written in results.items() if name == granularity)
+        print(f"{granularity}: {count} candles for {len(product_ids)} products")
+    print(f"Backfill finished in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
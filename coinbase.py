@@ -1,111 +1,445 @@
+import asyncio
 import requests
 import jwt
 import time
 import secrets
+import threading
+from requests.adapters import HTTPAdapter
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
-from config import load_settings
+from config import get_settings, SettingsError, KEY_NAME_ENV, KEY_SECRET_ENV
+from products import ProductCatalog, untradable_reason
+from paper import PaperExchange
+from accounts import AccountSync, ACCOUNTS_PAGE_LIMIT
+from ratelimit import (RateLimiter, PRIVATE_RATE, PUBLIC_RATE, PRIORITY_ORDER, PRIORITY_ACCOUNT,
+                       PRIORITY_PRICE, backoff_delay, parse_retry_after)
 import json
 import math
+from concurrent.futures import ThreadPoolExecutor
+from metrics import registry, increment, observe
+
+
+PRODUCTS_PATH = "/api/v3/brokerage/products"
+BEST_BID_ASK_PATH = "/api/v3/brokerage/best_bid_ask"
+QUOTE_BATCH_SIZE = 100  # Product IDs per best_bid_ask request, keeps the query string short
+QUOTE_WORKERS = 8  # Concurrent ticker requests when the bulk endpoint is unavailable
+
+PUBLIC_PATH_PREFIX = "/api/v3/brokerage/market/"
+MAX_RETRIES = 4
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+REQUEST_TIMEOUT = (3.05, 10)  # Seconds to connect and to wait for a response, a hung request is retried
+
+ORDERS_HISTORICAL_BATCH_PATH = "/api/v3/brokerage/orders/historical/batch"
+CANCEL_BATCH_PATH = "/api/v3/brokerage/orders/batch_cancel"
+ORDER_STATUS_BATCH_SIZE = 100  # Order IDs per historical batch request
+
+API_PREFIX = "/api/v3/brokerage/"
+
+JWT_LIFETIME = 120  # Seconds a signed token is accepted by Coinbase
+JWT_REFRESH_MARGIN = 15  # Re-sign this many seconds before a cached token expires
+
+
+def endpoint_label(path):
+    # Product IDs in the path would give every product its own series, so they are folded
+    parts = path.split("?")[0].removeprefix(API_PREFIX).strip("/").split("/")
+    for index in range(1, len(parts)):
+        if parts[index - 1] == "products":
+            parts[index] = "{product_id}"
+    return "/".join(parts)
+
+
+class CoinbaseClient:
+    def __init__(self, key_name, key_secret, request_host, pool_size=32, scheme="https",
+                 private_rate=PRIVATE_RATE, public_rate=PUBLIC_RATE, max_retries=MAX_RETRIES,
+                 timeout=REQUEST_TIMEOUT):
+        self.key_name = key_name
+        self.request_host = request_host
+        self.scheme = scheme
+        self.private_key = serialization.load_pem_private_key(
+            key_secret.encode('utf-8'), password=None, backend=default_backend())
+
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount(f'{scheme}://', self.adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+        self.private_limiter = RateLimiter(private_rate)
+        self.public_limiter = RateLimiter(public_rate)
+        for name, limiter in (("private", self.private_limiter), ("public", self.public_limiter)):
+            registry.gauge('autocoin_rate_limit_queue_depth', limiter.queue_depth, limiter=name)
+            registry.gauge('autocoin_rate_limit_max_queue_depth',
+                           lambda limiter=limiter: limiter.stats['max_queue_depth'], limiter=name)
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self._jwt_cache = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'requests': 0,
+            'retries': 0,
+            'jwt_signed': 0,
+            'jwt_cache_hits': 0,
+        }
 
-settings = load_settings()
-key_name = settings['key_name']
-key_secret = settings['key_secret'].replace("\\n", "\n")
-request_host = settings['request_host']
-
-
-def generate_jwt(uri):
-    private_key_bytes = key_secret.encode('utf-8')
-    private_key = serialization.load_pem_private_key(private_key_bytes, password=None, backend=default_backend())
-    jwt_payload = {
-        'sub': key_name,
-        'iss': "cdp",
-        'nbf': int(time.time()),
-        'exp': int(time.time()) + 120,
-        'uri': uri,
-    }
-    jwt_token = jwt.encode(
-        jwt_payload,
-        private_key,
-        algorithm='ES256',
-        headers={'kid': key_name, 'nonce': secrets.token_hex()},
-    )
-    return jwt_token
-
-
-def make_request(path, method="GET", payload=None):
-    uri = f"{method} {request_host}{path}"
-    jwt_token = generate_jwt(uri)
-    headers = {
-        'Authorization': f'Bearer {jwt_token}',
-        'Content-Type': 'application/json'
-    }
-    url = f'https://{request_host}{path}'
-    if method == "POST":
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
-    else:
-        response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        print(f"HTTP error for {url}: {response.status_code} {response.reason}")
-        print(response.text)
-    response.raise_for_status()  # Raise an exception for HTTP errors
-    return response.json()
+    def generate_jwt(self, uri=None):
+        now = time.time()
+        with self._lock:
+            cached = self._jwt_cache.get(uri)
+            if cached and cached[1] - JWT_REFRESH_MARGIN > now:
+                self.stats['jwt_cache_hits'] += 1
+                increment('autocoin_jwt_cache_hits_total')
+                return cached[0]
+
+        started = time.perf_counter()
+        issued = int(now)
+        jwt_payload = {
+            'sub': self.key_name,
+            'iss': "cdp",
+            'nbf': issued,
+            'exp': issued + JWT_LIFETIME,
+        }
+        if uri is not None:
+            jwt_payload['uri'] = uri  # WebSocket tokens are not bound to a request URI
+        jwt_token = jwt.encode(
+            jwt_payload,
+            self.private_key,
+            algorithm='ES256',
+            headers={'kid': self.key_name, 'nonce': secrets.token_hex()},
+        )
+        observe('autocoin_jwt_sign_seconds', time.perf_counter() - started)
+        with self._lock:
+            self._jwt_cache[uri] = (jwt_token, issued + JWT_LIFETIME)
+            self.stats['jwt_signed'] += 1
+        return jwt_token
+
+    def request(self, path, method="GET", payload=None, priority=None):
+        if priority is None:
+            if method == "POST":
+                priority = PRIORITY_ORDER
+            elif path.startswith(get_settings()['accounts_path']):
+                priority = PRIORITY_ACCOUNT
+            else:
+                priority = PRIORITY_PRICE
+        limiter_name = "public" if path.startswith(PUBLIC_PATH_PREFIX) else "private"
+        limiter = self.public_limiter if limiter_name == "public" else self.private_limiter
+
+        # Coinbase signs the path without its query string
+        uri = f"{method} {self.request_host}{path.split('?')[0]}"
+        url = f'{self.scheme}://{self.request_host}{path}'
+        body = json.dumps(payload) if method == "POST" else None
+        endpoint = endpoint_label(path)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            waited = limiter.acquire(priority)
+            observe('autocoin_rate_limit_wait_seconds', waited, limiter=limiter_name)
+            if waited > 0.001:
+                increment('autocoin_rate_limit_throttled_total', limiter=limiter_name)
+            headers = {'Authorization': f'Bearer {self.generate_jwt(uri)}'}
+            retry_after = None
+            try:
+                if method == "POST":
+                    # Order payloads carry a client_order_id, so a retried POST cannot place a second order
+                    response = self.session.post(url, headers=headers, data=body, timeout=self.timeout)
+                else:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= self.max_retries:
+                    increment('autocoin_request_failures_total', endpoint=endpoint, method=method)
+                    raise
+                error = str(e)
+            else:
+                with self._lock:
+                    self.stats['requests'] += 1
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    break
+                error = f"{response.status_code} {response.reason}"
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+            delay = backoff_delay(attempt, retry_after=retry_after)
+            if retry_after is not None:
+                limiter.pause(retry_after)
+                increment('autocoin_rate_limit_backoffs_total', limiter=limiter_name)
+            print(f"Retrying {method} {path} in {delay:.2f}s after {error}")
+            increment('autocoin_request_retries_total', endpoint=endpoint, method=method)
+            with self._lock:
+                self.stats['retries'] += 1
+            time.sleep(delay)
+            attempt += 1
+
+        # Latency includes limiter waits and retries, i.e. what the caller experienced
+        observe('autocoin_request_seconds', time.perf_counter() - started, endpoint=endpoint, method=method)
+        increment('autocoin_requests_total', endpoint=endpoint, method=method, status=response.status_code)
+        if response.status_code != 200:
+            print(f"HTTP error for {url}: {response.status_code} {response.reason}")
+            print(response.text)
+        response.raise_for_status()  # Raise an exception for HTTP errors
+        return response.json()
+
+    def connection_stats(self):
+        opened = 0
+        served = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                served += pool.num_requests
+        return {
+            'connections_opened': opened,
+            'connections_reused': max(served - opened, 0),
+            **self.stats,
+        }
+
+    def rate_limit_stats(self):
+        return {
+            'private': self.private_limiter.metrics(),
+            'public': self.public_limiter.metrics(),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+# The client, product catalog and paper exchange are built on first use, so importing
+# this module reads no settings, parses no keys and opens no connections
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def _lazy(name, factory):
+    instance = _instances.get(name, _instances)
+    if instance is _instances:
+        with _instances_lock:
+            if name not in _instances:
+                _instances[name] = factory()
+            instance = _instances[name]
+    return instance
+
+
+def _create_client():
+    settings = get_settings()
+    if not settings.has_credentials:
+        raise SettingsError(f"No API key configured: set {KEY_NAME_ENV} and {KEY_SECRET_ENV}, "
+                            f"or fill in settings.yaml")
+    return CoinbaseClient(settings['key_name'], settings['key_secret'], settings['request_host'],
+                          scheme=settings.get('request_scheme', 'https'),
+                          private_rate=settings.get('private_rate_limit', PRIVATE_RATE),
+                          public_rate=settings.get('public_rate_limit', PUBLIC_RATE))
+
+
+def get_client():
+    return _lazy('client', _create_client)
+
+
+def generate_jwt(uri=None):
+    return get_client().generate_jwt(uri)
+
+
+def make_request(path, method="GET", payload=None, priority=None):
+    return get_client().request(path, method=method, payload=payload, priority=priority)
+
+
+def get_accounts_page(cursor=None, limit=ACCOUNTS_PAGE_LIMIT):
+    paper_exchange = get_paper_exchange()
+    if paper_exchange is not None:
+        with paper_lock:
+            return {'accounts': paper_exchange.get_accounts(), 'has_next': False, 'cursor': ""}
+    accounts_path = get_settings()['accounts_path']
+    query = f"?limit={limit}" + (f"&cursor={cursor}" if cursor else "")
+    return make_request(f"{accounts_path}{query}")
+
+
+account_sync = AccountSync(get_accounts_page)
 
 
 def get_accounts():
-    accounts_path = settings['accounts_path']
-    return make_request(accounts_path).get('accounts', [])
+    return account_sync.fetch_all()
 
 
-def get_current_price(product_id):
-    prices_path = settings['prices_path'].format(product_id=product_id)
+def _book_price(levels):
+    if levels:
+        return float(levels[0]['price'])
+    return None
+
+
+def quote_price(quote):
+    # The bot values coins at the best bid, falling back to the last trade
+    if quote is None:
+        return None
+    if quote.get('bid') is not None:
+        return quote['bid']
+    return quote.get('last')
+
+
+def get_quote(product_id):
+    prices_path = get_settings()['prices_path'].format(product_id=product_id)
     try:
-        price_response = make_request(prices_path)
-        try:
-            return float(price_response['best_bid'])
-        except KeyError:
-            return float(price_response['trades'][0]['price'])
+        price_response = make_request(f"{prices_path}?limit=1")
+        trades = price_response.get('trades') or []
+        quote = {
+            'bid': float(price_response['best_bid']) if price_response.get('best_bid') else None,
+            'ask': float(price_response['best_ask']) if price_response.get('best_ask') else None,
+            'last': float(trades[0]['price']) if trades else None,
+            'time': time.time(),
+        }
+        quote['price'] = quote_price(quote)
+        return quote if quote['price'] is not None else None
     except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            print(f"HTTP error for {product_id}: {e}")
-            return None
-        else:
-            print(f"HTTP error for {product_id}: {e}")
+        print(f"HTTP error for {product_id}: {e}")
     except Exception as e:
         print(f"Error retrieving price for {product_id}: {e}")
     return None
 
 
+def _get_best_bid_ask(product_ids):
+    best_bid_ask_path = get_settings().get('best_bid_ask_path', BEST_BID_ASK_PATH)
+    quotes = {}
+    for start in range(0, len(product_ids), QUOTE_BATCH_SIZE):
+        batch = product_ids[start:start + QUOTE_BATCH_SIZE]
+        query = "&".join(f"product_ids={product_id}" for product_id in batch)
+        response = make_request(f"{best_bid_ask_path}?{query}")
+        now = time.time()
+        for book in response.get('pricebooks', []):
+            quote = {
+                'bid': _book_price(book.get('bids')),
+                'ask': _book_price(book.get('asks')),
+                'last': None,  # best_bid_ask carries no trades
+                'time': now,
+            }
+            quote['price'] = quote_price(quote)
+            if quote['price'] is not None:
+                quotes[book['product_id']] = quote
+    return quotes
+
+
+def get_quotes(product_ids):
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+
+    quotes = {}
+    try:
+        quotes = _get_best_bid_ask(product_ids)
+    except Exception as e:
+        print(f"Bulk price request failed, falling back to per-product tickers: {e}")
+
+    missing = [product_id for product_id in product_ids if product_id not in quotes]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(QUOTE_WORKERS, len(missing))) as executor:
+            for product_id, quote in zip(missing, executor.map(get_quote, missing)):
+                if quote is not None:
+                    quotes[product_id] = quote
+    return quotes
+
+
+_snapshot = {}
+_snapshot_lock = threading.Lock()
+
+
+def get_price_snapshot(product_ids, max_age=0):
+    # Quotes fetched within max_age seconds are shared between the trading loop,
+    # the balance refresh and the buy/sell paths instead of being fetched again
+    now = time.time()
+    with _snapshot_lock:
+        snapshot = {product_id: _snapshot[product_id] for product_id in product_ids
+                    if product_id in _snapshot and now - _snapshot[product_id]['time'] <= max_age}
+    stale = [product_id for product_id in product_ids if product_id not in snapshot]
+    if stale:
+        fresh = get_quotes(stale)
+        with _snapshot_lock:
+            _snapshot.update(fresh)
+        snapshot.update(fresh)
+        observe_quotes(fresh)
+    return snapshot
+
+
+def observe_quotes(quotes):
+    # Paper orders are matched against the same prices the bot trades on
+    paper_exchange = get_paper_exchange()
+    if paper_exchange is not None:
+        with paper_lock:
+            for product_id, quote in quotes.items():
+                paper_exchange.on_quote(product_id, quote)
+
+
+def get_current_price(product_id):
+    return quote_price(get_quote(product_id))
+
+
+def get_products():
+    return make_request(PRODUCTS_PATH).get('products', [])
+
+
+def get_product_catalog():
+    return _lazy('product_catalog',
+                 lambda: ProductCatalog(get_products, ttl=get_settings().get('product_cache_ttl', 3600)))
+
+
+def _create_paper_exchange():
+    # With trading_mode: paper, orders and balances go to an in-memory exchange while
+    # prices still come from Coinbase
+    settings = get_settings()
+    if settings.get('trading_mode', 'live') != 'paper':
+        return None
+    return PaperExchange(balances=dict(settings.get('paper_balances', {'USD': 10000.0})),
+                         fee_percent=settings.get('transaction_fee', 0.5),
+                         product_info=get_product_info)
+
+
+def get_paper_exchange():
+    return _lazy('paper_exchange', _create_paper_exchange)
+
+
+paper_lock = threading.Lock()
+
+
 def get_product_info(product_id):
-    products_path = "/api/v3/brokerage/products"
     try:
-        response = make_request(products_path)
-        products = response.get('products', [])
-        for product in products:
-            if product['product_id'] == product_id:
-                return product
+        return get_product_catalog().get(product_id)
     except Exception as e:
         print(f"Error retrieving product information for {product_id}: {e}")
     return None
 
 
-def place_market_order(product_id, side, usd_order_size=None, size=None):
-    orders_path = settings['orders_path']
+def product_exists(product_id):
+    # None when the catalog itself could not be loaded, so callers can tell
+    # "no such product" apart from a transient failure
+    try:
+        return get_product_catalog().get(product_id) is not None
+    except Exception as e:
+        print(f"Error retrieving product information for {product_id}: {e}")
+    return None
+
+
+def place_market_order(product_id, side, usd_order_size=None, size=None, current_price=None):
+    paper_exchange = get_paper_exchange()
+    if paper_exchange is not None:
+        with paper_lock:
+            return paper_exchange.place_market_order(product_id, side, usd_order_size=usd_order_size, size=size,
+                                                     current_price=current_price)
+    orders_path = get_settings()['orders_path']
     product_info = get_product_info(product_id)
 
     if product_info is None:
         print("Error: Unable to fetch product information.")
         return False, None, "Unable to fetch product information"
 
+    reason = untradable_reason(product_info, market=True)
+    if reason is not None:
+        print(f"Not placing {side} order for {product_id}: {reason}")
+        return False, None, f"Product not tradable: {reason}"
+
     base_currency_price_increment = abs(round(math.log10(float(product_info['base_increment']))))
 
-    current_price = get_current_price(product_id)
+    if usd_order_size:
+        if current_price is None:
+            current_price = get_current_price(product_id)
 
-    if current_price is None:
-        print(f"Error: Unable to fetch current price for {product_id}")
-        return False, None, "Unable to fetch current price"
+        if current_price is None:
+            print(f"Error: Unable to fetch current price for {product_id}")
+            return False, None, "Unable to fetch current price"
 
-    if usd_order_size:
         order_size = usd_order_size / current_price
     else:
         order_size = size
@@ -114,6 +448,10 @@ def place_market_order(product_id, side, usd_order_size=None, size=None):
         order_size = size
 
     order_size = math.floor(order_size * (10 ** base_currency_price_increment)) / (10 ** base_currency_price_increment)
+    min_size = float(product_info.get('base_min_size') or 0)
+    if order_size <= 0 or order_size < min_size:
+        print(f"Not placing {side} order for {product_id}: size {order_size} is below the minimum {min_size}")
+        return False, None, "INVALID_SIZE"
     formatted_size = f"{order_size:.{base_currency_price_increment}f}"
 
     order_payload = {
@@ -141,17 +479,30 @@ def place_market_order(product_id, side, usd_order_size=None, size=None):
 
 
 def place_limit_order(product_id, side, base_size, limit_price):
-    orders_path = settings['orders_path']
+    paper_exchange = get_paper_exchange()
+    if paper_exchange is not None:
+        with paper_lock:
+            return paper_exchange.place_limit_order(product_id, side, base_size, limit_price)
+    orders_path = get_settings()['orders_path']
     product_info = get_product_info(product_id)
 
     if product_info is None:
         print("Error: Unable to fetch product information.")
         return False, None, "Unable to fetch product information"
 
+    reason = untradable_reason(product_info, market=False)
+    if reason is not None:
+        print(f"Not placing {side} order for {product_id}: {reason}")
+        return False, None, f"Product not tradable: {reason}"
+
     base_currency_price_increment = abs(round(math.log10(float(product_info['base_increment']))))
     quote_currency_price_increment = abs(round(math.log10(float(product_info['quote_increment']))))
 
     formatted_size = f"{base_size:.{base_currency_price_increment}f}"
+    min_size = float(product_info.get('base_min_size') or 0)
+    if float(formatted_size) <= 0 or float(formatted_size) < min_size:
+        print(f"Not placing {side} order for {product_id}: size {formatted_size} is below the minimum {min_size}")
+        return False, None, "INVALID_SIZE"
     formatted_price = f"{limit_price:.{quote_currency_price_increment}f}"
 
     order_payload = {
@@ -179,18 +530,101 @@ def place_limit_order(product_id, side, base_size, limit_price):
         return False, None, str(e)
 
 
-def cancel_order(order_id):
-    cancel_path = "/api/v3/brokerage/orders/batch_cancel"
+def get_orders(order_ids):
+    paper_exchange = get_paper_exchange()
+    if paper_exchange is not None:
+        with paper_lock:
+            return [order for order in map(paper_exchange.get_order, order_ids) if order is not None]
+    orders = []
+    for start in range(0, len(order_ids), ORDER_STATUS_BATCH_SIZE):
+        batch = order_ids[start:start + ORDER_STATUS_BATCH_SIZE]
+        query = "&".join(f"order_ids={order_id}" for order_id in batch)
+        response = make_request(f"{ORDERS_HISTORICAL_BATCH_PATH}?{query}", priority=PRIORITY_ORDER)
+        orders.extend(response.get('orders', []))
+    return orders
+
+
+def cancel_orders(order_ids):
+    paper_exchange = get_paper_exchange()
+    if paper_exchange is not None:
+        with paper_lock:
+            return {order_id: paper_exchange.cancel_order(order_id) for order_id in order_ids}
     payload = {
-        "order_ids": [order_id]
+        "order_ids": list(order_ids)
     }
 
     try:
-        response = make_request(cancel_path, method="POST", payload=payload)
-        return response.get('results', [])[0].get('success', False)
+        response = make_request(CANCEL_BATCH_PATH, method="POST", payload=payload, priority=PRIORITY_ORDER)
+        return {result.get('order_id'): result.get('success', False) for result in response.get('results', [])}
     except requests.exceptions.HTTPError as e:
-        print(f"HTTP error canceling order {order_id}: {e}")
-        return False
+        print(f"HTTP error canceling orders {order_ids}: {e}")
+        return {order_id: False for order_id in order_ids}
     except Exception as e:
-        print(f"Error canceling order {order_id}: {e}")
-        return False
+        print(f"Error canceling orders {order_ids}: {e}")
+        return {order_id: False for order_id in order_ids}
+
+
+def cancel_order(order_id):
+    # Goes out with every other queued cancel in one batch request; orders imports this
+    # module, so the tracker is looked up here
+    from orders import order_tracker
+
+    order_tracker.request_cancel(order_id)
+    return order_tracker.flush_cancels().get(order_id, False)
+
+
+ENDPOINT_CONCURRENCY = {
+    'accounts': 2,
+    'prices': 4,
+    'products': 1,
+    'orders': 8,
+}
+
+
+class AsyncCoinbaseClient:
+    # Runs the pooled client's blocking calls on worker threads so one slow request
+    # never stalls the event loop; each endpoint has its own concurrency limit
+    def __init__(self, limits=None):
+        self.limits = dict(ENDPOINT_CONCURRENCY, **(limits or {}))
+        self._semaphores = {}
+
+    def _semaphore(self, endpoint):
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(self.limits.get(endpoint, 4))
+        return semaphore
+
+    async def call(self, endpoint, func, *args, **kwargs):
+        async with self._semaphore(endpoint):
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def get_accounts(self):
+        return await self.call('accounts', get_accounts)
+
+    async def sync_accounts(self):
+        return await self.call('accounts', account_sync.sync)
+
+    async def get_price_snapshot(self, product_ids, max_age=0):
+        return await self.call('prices', get_price_snapshot, product_ids, max_age=max_age)
+
+    async def get_product_info(self, product_id):
+        return await self.call('products', get_product_info, product_id)
+
+    async def product_exists(self, product_id):
+        return await self.call('products', product_exists, product_id)
+
+    async def place_market_order(self, product_id, side, usd_order_size=None, size=None, current_price=None):
+        return await self.call('orders', place_market_order, product_id, side, usd_order_size=usd_order_size,
+                               size=size, current_price=current_price)
+
+    async def place_limit_order(self, product_id, side, base_size, limit_price):
+        return await self.call('orders', place_limit_order, product_id, side, base_size, limit_price)
+
+    async def cancel_order(self, order_id):
+        return await self.call('orders', cancel_order, order_id)
+
+    async def get_orders(self, order_ids):
+        return await self.call('orders', get_orders, order_ids)
+
+    async def cancel_orders(self, order_ids):
+        return await self.call('orders', cancel_orders, order_ids)
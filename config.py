@@ -1,16 +1,32 @@
 import os
+import sys
+import threading
 import yaml
+from collections.abc import Mapping
 from pathlib import Path
+from types import MappingProxyType
+
+# Credentials can be injected without touching settings.yaml, e.g. from container secrets
+KEY_NAME_ENV = "COINBASE_KEY_NAME"
+KEY_SECRET_ENV = "COINBASE_KEY_SECRET"
+KEY_SECRET_FILE_ENV = "COINBASE_KEY_SECRET_FILE"
+# Lets processes that share one key split its rate limits
+PRIVATE_RATE_ENV = "AUTOCOIN_PRIVATE_RATE_LIMIT"
+PUBLIC_RATE_ENV = "AUTOCOIN_PUBLIC_RATE_LIMIT"
+
+
+class SettingsError(ValueError):
+    pass
 
 
 def ensure_settings_file():
     settings_dir = Path("settings")
     settings_file = settings_dir / "settings.yaml"
     coins_settings_file = settings_dir / "coins_settings.yaml"
-    trends_dir = Path("data/trends")
+    history_dir = Path("data/history")
 
     settings_dir.mkdir(parents=True, exist_ok=True)
-    trends_dir.mkdir(parents=True, exist_ok=True)
+    history_dir.mkdir(parents=True, exist_ok=True)
 
     if not settings_file.exists():
         default_settings = {
@@ -20,9 +36,36 @@ def ensure_settings_file():
             "accounts_path": "/api/v3/brokerage/accounts",  # The endpoint path for fetching account information
             "prices_path": "/api/v3/brokerage/products/{product_id}/ticker",
             # The endpoint path for fetching current prices
+            "best_bid_ask_path": "/api/v3/brokerage/best_bid_ask",  # The endpoint path for fetching prices in bulk
             "orders_path": "/api/v3/brokerage/orders",  # The endpoint path for creating orders
+            "product_cache_ttl": 3600,  # Seconds before the cached product catalog is refreshed
+            "market_data": "poll",  # "poll" the ticker endpoint or "stream" prices over WebSocket
+            "websocket_url": "wss://advanced-trade-ws.coinbase.com",  # Market data WebSocket endpoint
+            "stream_min_interval": 1,  # Minimum seconds between trend/buy/sell passes in stream mode
+            "endpoint_concurrency": {"accounts": 2, "prices": 4, "products": 1, "orders": 8},
+            # Maximum requests in flight per endpoint group
+            "private_rate_limit": 30,  # Requests per second to authenticated endpoints
+            "public_rate_limit": 10,  # Requests per second to public market endpoints
+            "trading_mode": "live",  # "live" sends orders to Coinbase, "paper" simulates them in memory
+            "paper_balances": {"USD": 10000.0},  # Starting balances for paper trading
             "spend_account": "USD",  # The account used for spending
             "refresh_interval": 60,  # Interval in seconds to refresh prices
+            "min_poll_interval": 5,  # Fastest a coin near its sale threshold or loss limit is polled
+            "max_poll_interval": 300,  # Slowest a quiet coin without a position is polled
+            "price_request_budget": 2,  # Price requests per second the scheduler may spend
+            "buy_interval": 60,  # Minimum seconds between buys of the same coin
+            "max_buys_per_minute": 10,  # Buy orders per minute across all coins, 0 disables the limit
+            "max_position_usd": 1000,  # No more buys of a coin once its holding is worth this much, 0 disables it
+            "state_flush_interval": 5,  # Seconds between coin state snapshots to disk
+            "candle_granularities": ["1m", "5m", "1h"],  # Candle sizes built from prices and backfilled
+            "warm_granularity": "1m",  # Candles used to warm indicators when tick history is short
+            "backfill_on_start": True,  # Fetch missing warm_granularity candles before trading starts
+            "backfill_interval": 3600,  # Seconds between fetches of missing candles, 0 disables them
+            "metrics_port": 0,  # Port for the Prometheus-style /metrics endpoint, 0 disables it
+            "metrics_file": "",  # File to dump metrics to as JSON, empty disables it
+            "metrics_dump_interval": 60,  # Seconds between JSON metric dumps
+            "profile_cycles": 0,  # Trading cycles to run the sampling profiler for, 0 disables it
+            "profile_file": "data/profile.folded",  # Where the profiler writes collapsed stacks
             "transaction_fee": 0.5,  # Transaction fee percentage
             "sale_threshold": 10,  # Sale threshold percentage
             "loss_limit": 5  # Loss limit percentage to trigger a sell
@@ -30,13 +73,39 @@ def ensure_settings_file():
 
         comments = {
             "key_name": "Coinbase Developer Platform API key name",
-            "key_secret": "The private key for the API, ensure newlines are escaped with \\n",
+            "key_secret": "The private key for the API, ensure newlines are escaped with \\n. COINBASE_KEY_NAME, COINBASE_KEY_SECRET or COINBASE_KEY_SECRET_FILE override the key",
             "request_host": "The host for the Coinbase API",
             "accounts_path": "The endpoint path for fetching account information",
             "prices_path": "The endpoint path for fetching current prices. {product_id} will be replaced with the actual product ID",
+            "best_bid_ask_path": "The endpoint path for fetching bid/ask prices for many products in one request",
             "orders_path": "The endpoint path for creating orders",
+            "product_cache_ttl": "Seconds before the cached product catalog (increments, min/max sizes, status) is refreshed",
+            "market_data": "How prices are received: poll the ticker endpoint every refresh_interval, or stream them over WebSocket",
+            "websocket_url": "The Advanced Trade market data WebSocket endpoint",
+            "stream_min_interval": "In stream mode, the minimum seconds between trend/buy/sell passes",
+            "endpoint_concurrency": "Maximum concurrent requests per endpoint group (accounts, prices, products, orders)",
+            "private_rate_limit": "Client-side limit in requests per second for authenticated endpoints, Coinbase allows 30",
+            "public_rate_limit": "Client-side limit in requests per second for public market endpoints, Coinbase allows 10",
+            "trading_mode": "live places real orders; paper matches orders in memory against live prices and tracks simulated balances",
+            "paper_balances": "Starting balances per currency when trading_mode is paper",
             "spend_account": "The account used for spending, default is USD",
-            "refresh_interval": "Interval in seconds to refresh prices",
+            "refresh_interval": "Interval in seconds to refresh balances, and the base interval for polling prices",
+            "min_poll_interval": "Seconds between price polls for a coin close to its sale threshold or loss limit",
+            "max_poll_interval": "Seconds between price polls for a quiet coin with no position",
+            "price_request_budget": "Price requests per second shared by all coins, the rest of the rate limit stays free for orders",
+            "buy_interval": "Minimum seconds between two buys of the same coin, however often its price is polled or streamed",
+            "max_buys_per_minute": "Buy orders per minute across all coins, including rejected ones, 0 disables the limit",
+            "max_position_usd": "Stop buying a coin once its holding plus the next buy would be worth more than this in USD, 0 disables the cap",
+            "state_flush_interval": "Seconds between coin state snapshots to data/state.json, coins_settings.yaml is re-exported every few minutes",
+            "candle_granularities": "Candle sizes (1m, 5m, 15m, 1h, 6h, 1d) aggregated from received prices into data/history/candles",
+            "warm_granularity": "Candle size whose closes warm the indicators for coins with little tick history, empty disables it",
+            "backfill_on_start": "Download missing candles for enabled coins on start, warm_granularity before trading and the rest in the background",
+            "backfill_interval": "Seconds between background fetches of missing candles in every candle_granularities size, 0 disables them",
+            "metrics_port": "Serve request, JWT, state I/O, indicator and trading-phase timings on http://127.0.0.1:<port>/metrics, 0 disables it",
+            "metrics_file": "Periodically write the same metrics as JSON to this file, leave empty to disable",
+            "metrics_dump_interval": "Seconds between JSON metric dumps",
+            "profile_cycles": "Sample stacks for this many trading cycles and write them for flamegraph.pl or speedscope, 0 disables it",
+            "profile_file": "Where the sampling profiler writes its collapsed stacks",
             "transaction_fee": "Transaction fee percentage",
             "sale_threshold": "Sale threshold percentage",
             "loss_limit": "Loss limit percentage to trigger a sell"
@@ -64,18 +133,145 @@ def ensure_settings_file():
         print(f"Created default coins settings file at {coins_settings_file}")
 
 
-def load_settings():
+class Settings(Mapping):
+    # Read-only view of settings.yaml, validated once; nested mappings are read-only too
+    def __init__(self, values):
+        self._values = MappingProxyType({key: MappingProxyType(dict(value)) if isinstance(value, dict) else value
+                                         for key, value in values.items()})
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return f"Settings({', '.join(key for key in self._values)})"
+
+    @property
+    def has_credentials(self):
+        key_name = self._values.get('key_name') or ""
+        # The generated settings file ships a placeholder key name
+        return bool(key_name) and "{" not in key_name and bool(self._values.get('key_secret'))
+
+
+CHOICES = {
+    'trading_mode': ("live", "paper"),
+    'market_data': ("poll", "stream"),
+    'request_scheme': ("https", "http"),
+}
+CANDLE_GRANULARITIES = ("1m", "5m", "15m", "1h", "6h", "1d")
+NUMBERS = ("refresh_interval", "transaction_fee", "sale_threshold", "loss_limit", "product_cache_ttl",
+           "stream_min_interval", "private_rate_limit", "public_rate_limit", "state_flush_interval",
+           "min_poll_interval", "max_poll_interval", "price_request_budget", "buy_interval",
+           "max_buys_per_minute", "max_position_usd", "backfill_interval")
+# Rates and budgets divide a request count, so 0 would stall or crash the limiter
+POSITIVE = ("private_rate_limit", "public_rate_limit", "price_request_budget")
+REQUIRED = ("request_host", "accounts_path", "prices_path", "orders_path", "refresh_interval")
+
+
+def validate_settings(settings):
+    missing = [key for key in REQUIRED if not settings.get(key)]
+    if missing:
+        raise SettingsError(f"settings.yaml is missing {', '.join(missing)}")
+    for key, choices in CHOICES.items():
+        if key in settings and settings[key] not in choices:
+            raise SettingsError(f"{key} must be one of {', '.join(choices)}, got {settings[key]!r}")
+    unknown = [name for name in settings.get('candle_granularities') or () if name not in CANDLE_GRANULARITIES]
+    if settings.get('warm_granularity') and settings['warm_granularity'] not in CANDLE_GRANULARITIES:
+        unknown.append(settings['warm_granularity'])
+    if unknown:
+        raise SettingsError(f"Candle granularities must be among {', '.join(CANDLE_GRANULARITIES)}, got {unknown!r}")
+    for key in NUMBERS:
+        value = settings.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0):
+            raise SettingsError(f"{key} must be a non-negative number, got {value!r}")
+    for key in POSITIVE:
+        if settings.get(key) is not None and settings[key] <= 0:
+            raise SettingsError(f"{key} must be greater than 0, got {settings[key]!r}")
+
+
+def apply_environment(settings, environ=os.environ):
+    if environ.get(KEY_NAME_ENV):
+        settings['key_name'] = environ[KEY_NAME_ENV]
+    if environ.get(KEY_SECRET_FILE_ENV):
+        with open(environ[KEY_SECRET_FILE_ENV], "r") as f:
+            settings['key_secret'] = f.read().strip()
+    elif environ.get(KEY_SECRET_ENV):
+        settings['key_secret'] = environ[KEY_SECRET_ENV]
+    if environ.get(PRIVATE_RATE_ENV):
+        settings['private_rate_limit'] = float(environ[PRIVATE_RATE_ENV])
+    if environ.get(PUBLIC_RATE_ENV):
+        settings['public_rate_limit'] = float(environ[PUBLIC_RATE_ENV])
+    if settings.get('key_secret'):
+        settings['key_secret'] = settings['key_secret'].replace("\\n", "\n")
+    return settings
+
+
+def read_settings(settings_file=Path("settings/settings.yaml")):
     ensure_settings_file()
-    settings_file = Path("settings/settings.yaml")
     with open(settings_file, "r") as f:
-        settings = yaml.safe_load(f)
+        settings = yaml.safe_load(f) or {}
+    settings = apply_environment(settings)
+    validate_settings(settings)
+    return Settings(settings)
 
-    if not settings['key_name'] or not settings['key_secret']:
-        settings['key_name'] = input("Enter your Coinbase API key name: ")
-        settings['key_secret'] = input("Enter your Coinbase API key secret: ").replace("\\n", "\n")
-        with open(settings_file, "w") as f:
-            yaml.dump(settings, f, default_flow_style=False, sort_keys=False)
 
+_settings = None
+_settings_lock = threading.Lock()
+
+
+def get_settings():
+    # Loaded on first use and shared afterwards, so importing a module costs nothing
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = read_settings()
+    return _settings
+
+
+def reset_settings():
+    global _settings
+    with _settings_lock:
+        _settings = None
+
+
+def prompt_for_credentials(settings_file=Path("settings/settings.yaml")):
+    # Only the interactive entry point asks; anything else fails fast without credentials
+    if get_settings().has_credentials:
+        return get_settings()
+    if not sys.stdin.isatty():
+        raise SettingsError(f"No API key configured: set {KEY_NAME_ENV} and {KEY_SECRET_ENV} "
+                            f"(or {KEY_SECRET_FILE_ENV}), or fill in settings.yaml")
+    with open(settings_file, "r") as f:
+        settings = yaml.safe_load(f) or {}
+    settings['key_name'] = input("Enter your Coinbase API key name: ")
+    settings['key_secret'] = input("Enter your Coinbase API key secret: ").replace("\\n", "\n")
+    with open(settings_file, "w") as f:
+        yaml.dump(settings, f, default_flow_style=False, sort_keys=False)
+    reset_settings()
+    return get_settings()
+
+
+STRATEGY_DEFAULTS = {
+    "transaction_fee": 0.5,
+    "sale_threshold": 10,
+    "loss_limit": 5,
+}
+
+
+def load_strategy_settings():
+    # Offline tools only need the strategy parameters, so this never prompts for API keys
+    settings = dict(STRATEGY_DEFAULTS)
+    settings_file = Path("settings/settings.yaml")
+    if settings_file.exists():
+        with open(settings_file, "r") as f:
+            loaded = yaml.safe_load(f) or {}
+        settings.update({key: loaded[key] for key in STRATEGY_DEFAULTS if key in loaded})
     return settings
 
 
@@ -85,20 +281,6 @@ def load_coins_settings():
         return yaml.safe_load(f)
 
 
-def save_trends(network, trends):
-    trends_file = Path(f"data/trends/{network}.yaml")
-    with open(trends_file, "w") as f:
-        yaml.dump(trends, f)
-
-
-def load_trends(network):
-    trends_file = Path(f"data/trends/{network}.yaml")
-    if trends_file.exists():
-        with open(trends_file, "r") as f:
-            return yaml.safe_load(f)
-    return []
-
-
 def update_coins_settings(settings):
     with open("settings/coins_settings.yaml", "w") as f:
         yaml.dump(settings, f, default_flow_style=False, sort_keys=False)
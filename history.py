@@ -0,0 +1,161 @@
+import threading
+import numpy as np
+from pathlib import Path
+
+TICK_DTYPE = np.dtype([('timestamp', '<f8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8')])
+# timestamp is the start of the candle's bucket
+CANDLE_DTYPE = np.dtype([('timestamp', '<f8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                         ('volume', '<f8')])
+
+HEADER_SIZE = 64  # Reserved bytes at the start of each file: magic, record count, capacity, record size
+HEADER_MAGIC = 0x41434849  # "ACHI"
+INITIAL_CAPACITY = 4096
+
+
+class Series:
+    def __init__(self, path, dtype=TICK_DTYPE, initial_capacity=INITIAL_CAPACITY):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "wb") as f:
+                f.truncate(HEADER_SIZE + initial_capacity * self.dtype.itemsize)
+            self._map_header()
+            self._header[:4] = [HEADER_MAGIC, 0, initial_capacity, self.dtype.itemsize]
+            self._header.flush()
+        else:
+            self._map_header()
+            if self._header[0] != HEADER_MAGIC or self._header[3] != self.dtype.itemsize:
+                raise ValueError(f"{self.path} is not a history file for {self.dtype}")
+        self._map_records()
+
+    def _map_header(self):
+        self._header = np.memmap(self.path, dtype='<i8', mode='r+', shape=(HEADER_SIZE // 8,))
+
+    def _map_records(self):
+        self._records = np.memmap(self.path, dtype=self.dtype, mode='r+', offset=HEADER_SIZE,
+                                  shape=(int(self._header[2]),))
+
+    def _grow(self, needed):
+        capacity = int(self._header[2])
+        while capacity < needed:
+            capacity *= 2
+        self._records.flush()
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + capacity * self.dtype.itemsize)
+        self._header[2] = capacity
+        # Views handed out earlier keep the old mapping alive, the file only ever grows
+        self._map_records()
+
+    def __len__(self):
+        return int(self._header[1])
+
+    def append(self, *values):
+        with self._lock:
+            count = int(self._header[1])
+            if count >= self._records.shape[0]:
+                self._grow(count + 1)
+            self._records[count] = values
+            self._header[1] = count + 1
+
+    def extend(self, records):
+        records = np.asarray(records, dtype=self.dtype)
+        with self._lock:
+            count = int(self._header[1])
+            if count + len(records) > self._records.shape[0]:
+                self._grow(count + len(records))
+            self._records[count:count + len(records)] = records
+            self._header[1] = count + len(records)
+
+    def merge(self, records):
+        # Inserts records in timestamp order, for data that arrives out of order such as a
+        # backfilled gap; a timestamp already stored keeps its record. Returns the number added.
+        records = np.asarray(records, dtype=self.dtype)
+        records = records[np.unique(records['timestamp'], return_index=True)[1]]
+        with self._lock:
+            count = int(self._header[1])
+            existing = self._records[:count]
+            records = records[~np.isin(records['timestamp'], existing['timestamp'])]
+            if len(records) == 0:
+                return 0
+            merged = np.concatenate([existing, records])
+            merged = merged[np.argsort(merged['timestamp'], kind='stable')]
+            if len(merged) > self._records.shape[0]:
+                self._grow(len(merged))
+            self._records[:len(merged)] = merged
+            self._header[1] = len(merged)
+        return len(records)
+
+    def all(self):
+        return self._records[:len(self)]
+
+    def last(self, n):
+        count = len(self)
+        return self._records[max(count - n, 0):count]
+
+    def range(self, start=None, end=None):
+        # Records are kept in time order, so both ends are a binary search
+        records = self.all()
+        timestamps = records['timestamp']
+        lo = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+        hi = len(records) if end is None else np.searchsorted(timestamps, end, side='right')
+        return records[lo:hi]
+
+    def last_timestamp(self):
+        count = len(self)
+        if count == 0:
+            return None
+        return float(self._records[count - 1]['timestamp'])
+
+    def flush(self):
+        with self._lock:
+            self._records.flush()
+            self._header.flush()
+
+
+class PriceHistory:
+    def __init__(self, directory="data/history", dtype=TICK_DTYPE, suffix=".ticks"):
+        self.directory = Path(directory)
+        self.dtype = dtype
+        self.suffix = suffix
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self, product_id):
+        series = self._series.get(product_id)
+        if series is None:
+            with self._lock:
+                series = self._series.get(product_id)
+                if series is None:
+                    series = Series(self.directory / f"{product_id}{self.suffix}", dtype=self.dtype)
+                    self._series[product_id] = series
+        return series
+
+    def products(self):
+        return sorted(path.name[:-len(self.suffix)] for path in self.directory.glob(f"*{self.suffix}"))
+
+    def append(self, product_id, timestamp, bid, ask, last):
+        self.series(product_id).append(
+            timestamp,
+            np.nan if bid is None else bid,
+            np.nan if ask is None else ask,
+            np.nan if last is None else last,
+        )
+
+    def append_quote(self, product_id, quote):
+        self.append(product_id, quote['time'], quote.get('bid'), quote.get('ask'), quote.get('last'))
+
+    def last(self, product_id, n):
+        return self.series(product_id).last(n)
+
+    def range(self, product_id, start=None, end=None):
+        return self.series(product_id).range(start, end)
+
+    def flush(self):
+        for series in list(self._series.values()):
+            series.flush()
+
+
+history = PriceHistory()
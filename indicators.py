@@ -0,0 +1,265 @@
+import math
+import threading
+import numpy as np
+
+RESYNC_INTERVAL = 10000  # Updates between exact recomputes of the running sums, bounds float drift
+WARM_POINTS = 10000  # History points replayed into a fresh engine, enough for every EMA to converge
+EMA_TAIL_EXPONENT = 600  # Oldest point an EMA warm-up looks at has weight ~e^-600 relative to the newest
+
+
+class RingBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.zeros(capacity)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, value):
+        end = (self.start + self.size) % self.capacity
+        self.data[end] = value
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def ago(self, k):
+        # k=0 is the newest value
+        return float(self.data[(self.start + self.size - 1 - k) % self.capacity])
+
+    def values(self):
+        end = self.start + self.size
+        if end <= self.capacity:
+            return self.data[self.start:end].copy()
+        return np.concatenate((self.data[self.start:], self.data[:end - self.capacity]))
+
+    def fill(self, values):
+        values = np.asarray(values[-self.capacity:], dtype=float)
+        self.data[:len(values)] = values
+        self.start = 0
+        self.size = len(values)
+
+
+def ema_alpha(span):
+    return 2.0 / (span + 1)
+
+
+def ema_series(values, alpha):
+    # Closed form of the EMA recursion; only the tail whose weights are still
+    # representable is used, so long histories neither overflow nor cost more
+    values = np.asarray(values, dtype=float)
+    tail = int(EMA_TAIL_EXPONENT / -math.log(1 - alpha)) if alpha < 1 else 1
+    values = values[-max(tail, 1):]
+    decay = (1 - alpha) ** np.arange(len(values))
+    weighted = np.cumsum(values[1:] / decay[1:]) * alpha
+    series = np.empty(len(values))
+    series[0] = values[0]
+    series[1:] = decay[1:] * (values[0] + weighted)
+    return series
+
+
+class IndicatorEngine:
+    def __init__(self, short_window=10, long_window=30, bollinger_window=20, bollinger_k=2.0,
+                 rsi_period=14, macd_fast=12, macd_slow=26, macd_signal=9):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.bollinger_window = bollinger_window
+        self.bollinger_k = bollinger_k
+        self.rsi_period = rsi_period
+        self.macd_fast = macd_fast
+        self.macd_slow = macd_slow
+        self.macd_signal = macd_signal
+
+        # One extra slot so the value leaving the longest window is still readable
+        self.prices = RingBuffer(max(short_window, long_window, bollinger_window) + 1)
+        self.count = 0
+        self.short_sum = 0.0
+        self.long_sum = 0.0
+        self.band_sum = 0.0
+        self.band_sq_sum = 0.0
+        self.ema_fast = None
+        self.ema_slow = None
+        self.macd_signal_value = None
+        self.avg_gain = None
+        self.avg_loss = None
+        self.last_price = None
+        self.previous_diff = None
+        self.diff = None
+
+    def _window_sum(self, running, window, price):
+        running += price
+        if len(self.prices) > window:
+            running -= self.prices.ago(window)
+        return running
+
+    def _resync(self):
+        values = self.prices.values()
+        self.short_sum = float(values[-self.short_window:].sum())
+        self.long_sum = float(values[-self.long_window:].sum())
+        band = values[-self.bollinger_window:]
+        self.band_sum = float(band.sum())
+        self.band_sq_sum = float((band * band).sum())
+
+    def update(self, price):
+        price = float(price)
+        self.prices.push(price)
+        self.count += 1
+
+        self.short_sum = self._window_sum(self.short_sum, self.short_window, price)
+        self.long_sum = self._window_sum(self.long_sum, self.long_window, price)
+        self.band_sum = self._window_sum(self.band_sum, self.bollinger_window, price)
+        evicted_sq = self.prices.ago(self.bollinger_window) ** 2 if len(self.prices) > self.bollinger_window else 0.0
+        self.band_sq_sum += price * price - evicted_sq
+        if self.count % RESYNC_INTERVAL == 0:
+            self._resync()
+
+        if self.ema_fast is None:
+            self.ema_fast = self.ema_slow = price
+            self.macd_signal_value = 0.0
+        else:
+            self.ema_fast += ema_alpha(self.macd_fast) * (price - self.ema_fast)
+            self.ema_slow += ema_alpha(self.macd_slow) * (price - self.ema_slow)
+            self.macd_signal_value += ema_alpha(self.macd_signal) * (self.macd() - self.macd_signal_value)
+
+        if self.last_price is not None:
+            change = price - self.last_price
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            if self.avg_gain is None:
+                self.avg_gain, self.avg_loss = gain, loss
+            else:
+                self.avg_gain += (gain - self.avg_gain) / self.rsi_period
+                self.avg_loss += (loss - self.avg_loss) / self.rsi_period
+        self.last_price = price
+
+        self.previous_diff = self.diff
+        short, long = self.sma_short(), self.sma_long()
+        self.diff = short - long if short is not None and long is not None else None
+        return self.values()
+
+    def sma_short(self):
+        if self.count < self.short_window:
+            return None
+        return self.short_sum / self.short_window
+
+    def sma_long(self):
+        if self.count < self.long_window:
+            return None
+        return self.long_sum / self.long_window
+
+    def bollinger(self):
+        if self.count < self.bollinger_window:
+            return None
+        mean = self.band_sum / self.bollinger_window
+        stddev = math.sqrt(max(self.band_sq_sum / self.bollinger_window - mean * mean, 0.0))
+        return mean - self.bollinger_k * stddev, mean, mean + self.bollinger_k * stddev, stddev
+
+    def rsi(self):
+        if self.count <= self.rsi_period or self.avg_gain is None:
+            return None
+        if self.avg_loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss)
+
+    def macd(self):
+        if self.ema_fast is None:
+            return None
+        return self.ema_fast - self.ema_slow
+
+    def trend(self):
+        if self.diff is None:
+            return None
+        if self.diff > 0:
+            return 'upward'
+        if self.diff < 0:
+            return 'downward'
+        return 'stable'
+
+    def crossover(self):
+        if self.diff is None or self.previous_diff is None:
+            return None
+        if self.previous_diff <= 0 < self.diff:
+            return 'golden'
+        if self.previous_diff >= 0 > self.diff:
+            return 'death'
+        return None
+
+    def values(self):
+        bollinger = self.bollinger()
+        macd = self.macd()
+        return {
+            'sma_short_term': self.sma_short(),
+            'sma_long_term': self.sma_long(),
+            'stddev': bollinger[3] if bollinger else None,
+            'bollinger_lower': bollinger[0] if bollinger else None,
+            'bollinger_upper': bollinger[2] if bollinger else None,
+            'rsi': self.rsi(),
+            'macd': macd,
+            'macd_signal': self.macd_signal_value,
+            'macd_histogram': macd - self.macd_signal_value if macd is not None else None,
+            'trend': self.trend(),
+            'crossover': self.crossover(),
+        }
+
+    def warm(self, prices):
+        # Rebuild every indicator's state from a price array in one vectorized pass
+        prices = np.asarray(prices, dtype=float)
+        prices = prices[~np.isnan(prices)]
+        if len(prices) == 0:
+            return
+        self.prices.fill(prices)
+        self.count = len(prices)
+        self._resync()
+
+        fast = ema_series(prices, ema_alpha(self.macd_fast))
+        slow = ema_series(prices, ema_alpha(self.macd_slow))
+        overlap = min(len(fast), len(slow))
+        macd = fast[-overlap:] - slow[-overlap:]
+        self.ema_fast, self.ema_slow = float(fast[-1]), float(slow[-1])
+        signal = ema_series(macd, ema_alpha(self.macd_signal))
+        self.macd_signal_value = float(signal[-1])
+
+        changes = np.diff(prices)
+        if len(changes):
+            self.avg_gain = float(ema_series(np.maximum(changes, 0.0), 1.0 / self.rsi_period)[-1])
+            self.avg_loss = float(ema_series(np.maximum(-changes, 0.0), 1.0 / self.rsi_period)[-1])
+        self.last_price = float(prices[-1])
+
+        self.diff = self.previous_diff = None
+        if len(prices) > self.long_window:
+            previous = prices[:-1]
+            self.previous_diff = float(previous[-self.short_window:].mean() - previous[-self.long_window:].mean())
+        short, long = self.sma_short(), self.sma_long()
+        if short is not None and long is not None:
+            self.diff = short - long
+
+
+engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(product_id):
+    engine = engines.get(product_id)
+    if engine is None:
+        with _engines_lock:
+            engine = engines.setdefault(product_id, IndicatorEngine())
+    return engine
+
+
+def warm_engines(history, product_ids, points=None, candles=None):
+    # candles is an optional candle store; closes older than the first recorded tick
+    # fill in the start of the window, so a fresh install warms from backfilled data
+    points = points or WARM_POINTS
+    for product_id in product_ids:
+        engine = get_engine(product_id)
+        records = history.series(product_id).last(points)
+        prices = np.where(np.isnan(records['bid']), records['last'], records['bid'])
+        if candles is not None and len(prices) < points:
+            closes = candles.series(product_id).last(points)
+            if len(records):
+                closes = closes[closes['timestamp'] < records['timestamp'][0]]
+            prices = np.concatenate([closes['close'][len(prices) - points:], prices])
+        if len(prices) == 0:
+            continue
+        engine.warm(prices)
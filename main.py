@@ -1,87 +1,150 @@
-from config import load_settings, load_coins_settings, update_coins_settings, save_trends, load_trends, ensure_settings_file
-from coinbase import get_accounts, get_current_price
-from trading import check_price_trends
-import threading
-import time
+from config import prompt_for_credentials
+from coinbase import AsyncCoinbaseClient, quote_price, get_product_catalog, generate_jwt, account_sync
+from trading import check_price_trends, evaluate_opportunities
+from state import store
+from history import history
+from indicators import warm_engines
+from candles import aggregator, backfill, candle_store, DEFAULT_GRANULARITIES
+from market_data import MarketDataFeed, WS_URL
+from metrics import timer, MetricsServer, start_json_dump, start_profiler
+import asyncio
 
-def refresh_balances_and_prices(settings):
-    accounts = get_accounts()
-    coins_settings = load_coins_settings()
+async def refresh_balances_and_prices(client, settings):
+    accounts, changed = await client.sync_accounts()
+    changed = {account['currency'] for account in changed}
+    coins_settings = store.coins()
+
+    # Empty, disabled wallets are only revisited every few cycles; a shard only keeps
+    # the wallets it was assigned
+    accounts = [account for account in accounts
+                if store.in_scope(account['currency'])
+                and account_sync.is_due(account['currency'],
+                                        coins_settings.get(account['currency'], {}).get('enabled', False))]
+
+    # One price snapshot for every convertible account, shared with the trading loop
+    product_ids = [f"{account['currency']}-USD" for account in accounts
+                   if account['currency'].upper() not in ['USD', 'USDC']
+                   and coins_settings.get(account['currency'], {}).get('enable_conversion', True)]
+    quotes = await client.get_price_snapshot(product_ids, max_age=settings['refresh_interval'])
 
     for account in accounts:
         network = account['currency']
         balance = float(account['available_balance']['value'])
         product_id = f"{network}-USD"
         current_price = None
-
-        # Ensure the network settings exist
-        if network not in coins_settings:
-            coins_settings[network] = {
-                'enabled': False,
-                'current_price': 1.0,
-                'current_cost_usd': -1,
-                'usd_value': 0.0,
-                'balance': balance,
-                'trend_status': None,
-                'previous_price': 0.0,
-                'enable_conversion': True
-            }
-
-        if coins_settings[network].get('enable_conversion', True):
-            current_price = get_current_price(product_id)
-            if current_price is None:
-                coins_settings[network]['enable_conversion'] = False
-                current_price = 1.0  # Set to 1.0 when no ticker is available
-        else:
-            current_price = float(coins_settings[network].get('current_price', 1.0))
+        coin_settings = coins_settings.get(network, {})
+        updates = {}
 
         if network.upper() in ['USD', 'USDC']:
             current_price = 1.0
+        elif coin_settings.get('enable_conversion', True):
+            current_price = quote_price(quotes.get(product_id))
+            if current_price is None:
+                if await client.product_exists(product_id) is False:
+                    updates['enable_conversion'] = False
+                    current_price = 1.0  # Set to 1.0 when no ticker is available
+                else:
+                    # A transient failure keeps the last known price and leaves conversion on
+                    current_price = float(coin_settings.get('current_price', 1.0))
+        else:
+            current_price = float(coin_settings.get('current_price', 1.0))
 
         usd_value = balance * current_price
 
-        if current_price is not None:
+        if network in changed:
             print(f"Account: {account['name']}")
             print(f"Network: {network}")
             print(f"Balance: {balance}")
             print(f"Current Price (USD): {current_price}")
             print(f"USD Value: {usd_value}\n")
-        else:
-            print(f"Could not retrieve price for {network}. Skipping...\n")
-
-        # Update the network settings with the current data
-        coins_settings[network]['current_price'] = current_price
-        coins_settings[network]['usd_value'] = usd_value
-        coins_settings[network]['balance'] = balance
-        if 'current_cost_usd' not in coins_settings[network]:
-            coins_settings[network]['current_cost_usd'] = -1
-        if 'enabled' not in coins_settings[network]:
-            coins_settings[network]['enabled'] = False
-        if 'trend_status' not in coins_settings[network]:
-            coins_settings[network]['trend_status'] = None
-        if 'previous_price' not in coins_settings[network]:
-            coins_settings[network]['previous_price'] = current_price
-        if 'enable_conversion' not in coins_settings[network]:
-            coins_settings[network]['enable_conversion'] = True
-
-        # Load and save trends
-        price_trends = load_trends(network)
-        save_trends(network, price_trends)
-
-    update_coins_settings(coins_settings)
 
-def main():
-    ensure_settings_file()
-    settings = load_settings()
-    refresh_balances_and_prices(settings)
+        # Ensure the network settings exist, then update them with the current data
+        store.setdefaults(network, {
+            'enabled': False,
+            'current_cost_usd': -1,
+            'trend_status': None,
+            'previous_price': current_price,
+            'enable_conversion': True
+        })
+        updates['current_price'] = current_price
+        updates['usd_value'] = usd_value
+        updates['balance'] = balance
+        updates = {key: value for key, value in updates.items() if coin_settings.get(key) != value}
+        if updates:
+            store.update(network, updates)
+
+async def refresh_balances(client, settings):
+    while True:
+        await asyncio.sleep(settings['refresh_interval'])
+        try:
+            with timer('autocoin_phase_seconds', phase="refresh_balances"):
+                await refresh_balances_and_prices(client, settings)
+        except Exception as e:
+            print(f"Error refreshing balances: {e}")
 
-    price_trends_thread = threading.Thread(target=check_price_trends)
-    price_trends_thread.daemon = True
-    price_trends_thread.start()
+async def warm_indicators(settings):
+    product_ids = [f"{coin}-USD" for coin in store.enabled_coins()]
+    aggregator.set_granularities(settings.get('candle_granularities', DEFAULT_GRANULARITIES))
+    granularity = settings.get('warm_granularity', "1m")
+    candles = None
+    if granularity:
+        if settings.get('backfill_on_start', True):
+            with timer('autocoin_phase_seconds', phase="backfill"):
+                await asyncio.to_thread(backfill, product_ids, [granularity])
+        candles = candle_store(granularity)
+    await asyncio.to_thread(warm_engines, history, product_ids, None, candles)
 
+async def backfill_candles(settings):
+    # Re-run now and then, so gaps from downtime or a restart are filled in every
+    # configured granularity, not just the one that warms the indicators. Without
+    # backfill_on_start the first pass waits a full interval.
+    interval = settings.get('backfill_interval', 3600)
+    if not settings.get('backfill_on_start', True):
+        await asyncio.sleep(interval)
     while True:
-        time.sleep(settings['refresh_interval'])
-        refresh_balances_and_prices(settings)
+        product_ids = [f"{coin}-USD" for coin in store.enabled_coins()]
+        try:
+            with timer('autocoin_phase_seconds', phase="backfill"):
+                await asyncio.to_thread(backfill, product_ids,
+                                        settings.get('candle_granularities', DEFAULT_GRANULARITIES))
+        except Exception as e:
+            print(f"Error backfilling candles: {e}")
+        await asyncio.sleep(interval)
+
+async def run(settings, feed=None, extra_tasks=()):
+    client = AsyncCoinbaseClient(settings.get('endpoint_concurrency'))
+    await refresh_balances_and_prices(client, settings)
+    await warm_indicators(settings)
+
+    tasks = [asyncio.create_task(task) for task in extra_tasks]
+    if settings.get('backfill_interval', 3600):
+        tasks.append(asyncio.create_task(backfill_candles(settings)))
+    if feed is None and settings.get('market_data', 'poll') == 'stream':
+        feed = MarketDataFeed([f"{coin}-USD" for coin in store.enabled_coins()],
+                              url=settings.get('websocket_url', WS_URL), jwt_factory=generate_jwt)
+        tasks.append(asyncio.create_task(feed.run()))
+
+    # Balance refresh, price/trend updates and buy/sell evaluation run independently,
+    # so a slow request in one never holds up the others
+    evaluations = asyncio.Queue()
+    tasks.append(asyncio.create_task(refresh_balances(client, settings)))
+    tasks.append(asyncio.create_task(check_price_trends(client, evaluations, settings, feed)))
+    tasks.append(asyncio.create_task(evaluate_opportunities(client, evaluations, settings)))
+    await asyncio.gather(*tasks)
+
+def main():
+    settings = prompt_for_credentials()
+    store.flush_interval = settings.get('state_flush_interval', store.flush_interval)
+    store.start()
+    get_product_catalog().start_background_refresh()
+    if settings.get('metrics_port'):
+        MetricsServer(settings['metrics_port']).start()
+        print(f"Serving metrics on http://127.0.0.1:{settings['metrics_port']}/metrics")
+    if settings.get('metrics_file'):
+        start_json_dump(settings['metrics_file'], settings.get('metrics_dump_interval', 60))
+    if settings.get('profile_cycles'):
+        start_profiler(settings['profile_cycles'], settings.get('profile_file', "data/profile.folded"))
+    asyncio.run(run(settings))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import random
+import threading
+import time
+import websockets
+
+WS_URL = "wss://advanced-trade-ws.coinbase.com"
+MAX_MESSAGE_SIZE = 10 * 1024 * 1024  # Ticker snapshots for hundreds of products arrive in one frame
+RECV_TIMEOUT = 1  # Seconds between checks for subscription changes while the feed is quiet
+
+
+def _float(value):
+    if value in (None, ""):
+        return None
+    return float(value)
+
+
+class MarketDataFeed:
+    def __init__(self, product_ids, url=WS_URL, channel="ticker", jwt_factory=None,
+                 reconnect_delay=1, max_reconnect_delay=60, stale_after=30):
+        self.product_ids = list(product_ids)
+        self.url = url
+        self.channel = channel
+        self.jwt_factory = jwt_factory
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.stale_after = stale_after
+
+        self.quotes = {}
+        self.updated = {}
+        self.price_event = threading.Event()
+        self._async_event = None
+        self.stats = {'messages': 0, 'connects': 0, 'sequence_gaps': 0, 'resubscribes': 0}
+        self._lock = threading.Lock()
+        self._resubscribe = False
+        self._subscribed = []
+        self._last_sequence = None
+        self._last_message = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _subscription(self, message_type, channel, product_ids):
+        message = {'type': message_type, 'channel': channel}
+        if product_ids:
+            message['product_ids'] = product_ids
+        if self.jwt_factory is not None:
+            message['jwt'] = self.jwt_factory()
+        return json.dumps(message)
+
+    async def _subscribe(self, websocket):
+        with self._lock:
+            product_ids = list(self.product_ids)
+            self._resubscribe = False
+        if self._subscribed:
+            await websocket.send(self._subscription('unsubscribe', self.channel, self._subscribed))
+        await websocket.send(self._subscription('subscribe', self.channel, product_ids))
+        # Heartbeats keep the connection open and the sequence numbers moving for quiet products
+        await websocket.send(self._subscription('subscribe', 'heartbeats', None))
+        self._subscribed = product_ids
+
+    def handle_message(self, message):
+        self._last_message = time.time()
+        self.stats['messages'] += 1
+
+        sequence = message.get('sequence_num')
+        gap = False
+        if sequence is not None:
+            if self._last_sequence is not None and sequence != self._last_sequence + 1:
+                self.stats['sequence_gaps'] += 1
+                print(f"Market data sequence gap: expected {self._last_sequence + 1}, got {sequence}")
+                gap = True
+            self._last_sequence = sequence
+
+        if message.get('channel') == self.channel:
+            now = time.time()
+            with self._lock:
+                for event in message.get('events', []):
+                    for ticker in event.get('tickers', []):
+                        quote = {
+                            'bid': _float(ticker.get('best_bid')),
+                            'ask': _float(ticker.get('best_ask')),
+                            'last': _float(ticker.get('price')),
+                            'time': now,
+                        }
+                        quote['price'] = quote['bid'] if quote['bid'] is not None else quote['last']
+                        if quote['price'] is None:
+                            continue
+                        self.quotes[ticker['product_id']] = quote
+                        self.updated[ticker['product_id']] = quote
+            if self.updated:
+                self.price_event.set()
+                if self._async_event is not None:
+                    self._async_event.set()
+        elif message.get('type') == 'error':
+            print(f"Market data error: {message.get('message')}")
+        return gap
+
+    async def _consume(self, websocket):
+        await self._subscribe(websocket)
+        while not self._stop.is_set():
+            if self._resubscribe:
+                self.stats['resubscribes'] += 1
+                await self._subscribe(websocket)
+            try:
+                raw = await asyncio.wait_for(websocket.recv(), timeout=RECV_TIMEOUT)
+            except asyncio.TimeoutError:
+                if self._last_message and time.time() - self._last_message > self.stale_after:
+                    raise ConnectionError(f"No market data for {self.stale_after}s")
+                continue
+            if self.handle_message(json.loads(raw)):
+                # A fresh subscribe makes the exchange resend a full snapshot
+                self._resubscribe = True
+
+    async def run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            try:
+                async with websockets.connect(self.url, max_size=MAX_MESSAGE_SIZE) as websocket:
+                    self.stats['connects'] += 1
+                    self._last_sequence = None
+                    self._last_message = time.time()
+                    self._subscribed = []
+                    delay = self.reconnect_delay
+                    await self._consume(websocket)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                print(f"Market data connection lost ({e}), reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay * (0.5 + random.random()))
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def set_products(self, product_ids):
+        with self._lock:
+            if sorted(product_ids) != sorted(self.product_ids):
+                self.product_ids = list(product_ids)
+                self._resubscribe = True
+
+    def snapshot(self, product_ids=None):
+        now = time.time()
+        with self._lock:
+            if product_ids is None:
+                product_ids = list(self.quotes)
+            return {product_id: dict(self.quotes[product_id]) for product_id in product_ids
+                    if product_id in self.quotes and now - self.quotes[product_id]['time'] <= self.stale_after}
+
+    def drain_updates(self):
+        with self._lock:
+            updated, self.updated = self.updated, {}
+            self.price_event.clear()
+            if self._async_event is not None:
+                self._async_event.clear()
+        return updated
+
+    def wait_for_prices(self, timeout=None):
+        return self.price_event.wait(timeout)
+
+    async def next_prices(self, timeout=None):
+        # For use when run() is a task on the caller's event loop rather than started in a thread
+        if self._async_event is None:
+            self._async_event = asyncio.Event()
+            if self.updated:
+                self._async_event.set()
+        try:
+            await asyncio.wait_for(self._async_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
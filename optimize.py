@@ -0,0 +1,153 @@
+import argparse
+import csv
+import itertools
+import os
+import random
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from backtest import DEFAULT_BASE_INCREMENT, load_directory, run_backtest, summarize
+from config import load_strategy_settings
+from history import PriceHistory
+from products import ProductCatalog
+from strategy import SHORT_WINDOW, LONG_WINDOW
+
+PARAMETERS = ['sale_threshold', 'loss_limit', 'transaction_fee', 'short_window', 'long_window']
+INTEGER_PARAMETERS = {'short_window', 'long_window'}
+RANK_METRICS = ['pnl', 'realised_pnl', 'return_over_drawdown', 'win_rate']
+
+_series = {}
+_increments = {}
+
+
+def parse_space(value, integer=False):
+    # "10" -> [10], "5,10,15" -> a list, "5:20:5" -> inclusive range with a step
+    cast = int if integer else float
+    if ":" in value:
+        start, stop, step = (float(part) for part in value.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+        return [cast(round(v, 10)) for v in values]
+    return [cast(v) for v in value.split(",")]
+
+
+def grid(space):
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def random_samples(space, count, seed=None):
+    generator = random.Random(seed)
+    for _ in range(count):
+        sample = {}
+        for name, values in space.items():
+            low, high = min(values), max(values)
+            sample[name] = generator.randint(low, high) if name in INTEGER_PARAMETERS else generator.uniform(low, high)
+        yield sample
+
+
+def share_series(series, directory):
+    # Each product is written once as a contiguous (n, 2) array; workers map the
+    # files read-only, so every process shares the same page-cache copy
+    directory = Path(directory)
+    for product_id, (timestamps, prices) in series.items():
+        np.save(directory / f"{product_id}.npy", np.column_stack((timestamps, prices)))
+    return sorted(series)
+
+
+def _init_worker(directory, product_ids, increments):
+    for product_id in product_ids:
+        _series[product_id] = np.load(Path(directory) / f"{product_id}.npy", mmap_mode='r')
+    _increments.update(increments)
+
+
+def _evaluate(parameters):
+    if parameters['short_window'] >= parameters['long_window']:
+        return None
+    results = {}
+    for product_id, data in _series.items():
+        results[product_id] = run_backtest(data[:, 0], data[:, 1], base_increment=_increments[product_id],
+                                           **parameters)
+    summary = summarize(results)
+    summary['return_over_drawdown'] = summary['pnl'] / summary['max_drawdown'] if summary['max_drawdown'] else 0.0
+    return dict(parameters, **summary)
+
+
+def run_sweep(series, candidates, increments, workers=None, chunksize=4):
+    with tempfile.TemporaryDirectory(prefix="autocoin-sweep-") as directory:
+        product_ids = share_series(series, directory)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(directory, product_ids, increments)) as executor:
+            return [row for row in executor.map(_evaluate, candidates, chunksize=chunksize) if row is not None]
+
+
+def write_results(rows, path, metric):
+    rows = sorted(rows, key=lambda row: row[metric], reverse=True)
+    columns = ['rank', *PARAMETERS, 'pnl', 'realised_pnl', 'fees', 'trades', 'win_rate', 'max_drawdown',
+               'return_over_drawdown']
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for rank, row in enumerate(rows, start=1):
+            writer.writerow([rank, *(row[column] for column in columns[1:])])
+    return rows
+
+
+def main():
+    strategy_settings = load_strategy_settings()
+    parser = argparse.ArgumentParser(description="Sweep strategy settings over stored price history")
+    parser.add_argument("data", nargs="?", default=str(PriceHistory().directory),
+                        help="Directory of <product_id>.ticks/.csv/.npy files (default: data/history)")
+    parser.add_argument("--products", nargs="*", help="Only these product IDs")
+    parser.add_argument("--sale-threshold", default=str(strategy_settings['sale_threshold']),
+                        help="Value, comma list or start:stop:step")
+    parser.add_argument("--loss-limit", default=str(strategy_settings['loss_limit']))
+    parser.add_argument("--fee", default=str(strategy_settings['transaction_fee']))
+    parser.add_argument("--short-window", default=str(SHORT_WINDOW))
+    parser.add_argument("--long-window", default=str(LONG_WINDOW))
+    parser.add_argument("--order-size", type=float, default=100, help="USD spent per buy")
+    parser.add_argument("--random", type=int, help="Sample this many points uniformly instead of the full grid")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--rank-by", choices=RANK_METRICS, default='pnl')
+    parser.add_argument("--output", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    space = {
+        'sale_threshold': parse_space(args.sale_threshold),
+        'loss_limit': parse_space(args.loss_limit),
+        'transaction_fee': parse_space(args.fee),
+        'short_window': parse_space(args.short_window, integer=True),
+        'long_window': parse_space(args.long_window, integer=True),
+    }
+    candidates = list(random_samples(space, args.random, args.seed) if args.random else grid(space))
+    for candidate in candidates:
+        candidate['usd_order_size'] = args.order_size
+
+    series = load_directory(args.data, args.products)
+    catalog = ProductCatalog(None)
+    increments = {}
+    for product_id in series:
+        product = catalog.peek(product_id)
+        increments[product_id] = float(product['base_increment']) if product and product.get('base_increment') \
+            else DEFAULT_BASE_INCREMENT
+
+    started = time.perf_counter()
+    rows = run_sweep(series, candidates, increments, workers=args.workers)
+    elapsed = time.perf_counter() - started
+    rows = write_results(rows, args.output, args.rank_by)
+
+    print(f"Evaluated {len(rows)} settings over {len(series)} products with {args.workers} workers "
+          f"in {elapsed:.2f}s")
+    print(f"{'Rank':<6}{'Sale %':>8}{'Loss %':>8}{'Fee %':>7}{'SMA':>8}{'PnL':>12}{'Max DD':>10}{'Trades':>8}")
+    for rank, row in enumerate(rows[:10], start=1):
+        print(f"{rank:<6}{row['sale_threshold']:>8.2f}{row['loss_limit']:>8.2f}{row['transaction_fee']:>7.2f}"
+              f"{row['short_window']:>4}/{row['long_window']:<3}{row['pnl']:>12.2f}{row['max_drawdown']:>10.2f}"
+              f"{row['trades']:>8}")
+    print(f"Full ranking written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
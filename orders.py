@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import Counter
+from coinbase import get_orders, cancel_orders, account_sync, get_product_catalog
+from state import store
+
+TERMINAL_STATUSES = {'FILLED', 'CANCELLED', 'EXPIRED', 'FAILED'}
+ORDER_TIMEOUT = 300  # Seconds an order may stay open before the tracker cancels it
+MISSING_POLLS = 3  # Status polls an order may be absent from before it is dropped
+
+
+class OrderTracker:
+    def __init__(self, fetch_orders, cancel_orders, synced_balance, product_info=None, order_timeout=ORDER_TIMEOUT,
+                 missing_polls=MISSING_POLLS, clock=time.time):
+        self.fetch_orders = fetch_orders
+        self.cancel_orders = cancel_orders
+        self.synced_balance = synced_balance
+        self.product_info = product_info
+        self.order_timeout = order_timeout
+        self.missing_polls = missing_polls
+        self.clock = clock
+        self.open_orders = {}
+        self.pending_cancels = set()
+        self._lock = threading.Lock()
+        self.stats = {'tracked': 0, 'filled': 0, 'closed_unfilled': 0, 'polls': 0, 'cancel_batches': 0,
+                      'timed_out': 0, 'lost': 0}
+        self.placed = Counter()  # Orders per product, a measure of how much work each product causes
+
+    def track(self, order_id, product_id, side, coin):
+        with self._lock:
+            self.open_orders[order_id] = {
+                'order_id': order_id,
+                'product_id': product_id,
+                'side': side,
+                'coin': coin,
+                'placed': self.clock(),
+                'missing': 0,  # Consecutive polls the exchange did not return this order
+                'cancel_requested': False,
+                # Lets a fill tell whether the account sync has already counted it
+                'synced_balance': self.synced_balance(coin),
+            }
+            self.stats['tracked'] += 1
+            self.placed[product_id] += 1
+
+    def has_open(self, coin, side=None):
+        with self._lock:
+            return any(order['coin'] == coin and (side is None or order['side'] == side)
+                       for order in self.open_orders.values())
+
+    def open_sides(self):
+        with self._lock:
+            return {(order['coin'], order['side']) for order in self.open_orders.values()}
+
+    def request_cancel(self, order_id):
+        # Sent with every other pending cancel in one batch on the next settle pass
+        with self._lock:
+            self.pending_cancels.add(order_id)
+            if order_id in self.open_orders:
+                self.open_orders[order_id]['cancel_requested'] = True
+
+    def flush_cancels(self):
+        with self._lock:
+            order_ids, self.pending_cancels = list(self.pending_cancels), set()
+        if not order_ids:
+            return {}
+        self.stats['cancel_batches'] += 1
+        return self.cancel_orders(order_ids)
+
+    def poll(self):
+        # One historical-batch request covers every open order
+        with self._lock:
+            order_ids = list(self.open_orders)
+        if not order_ids:
+            return []
+        self.stats['polls'] += 1
+        now = self.clock()
+        closed = []
+        returned = set()
+        for order in self.fetch_orders(order_ids):
+            if order.get('status') == 'UNKNOWN_ORDER_STATUS':
+                continue  # Counted as missing below
+            returned.add(order['order_id'])
+            if order.get('status') not in TERMINAL_STATUSES:
+                with self._lock:
+                    tracked = self.open_orders.get(order['order_id'])
+                if tracked is not None:
+                    tracked['missing'] = 0
+                    if not tracked['cancel_requested'] and now - tracked['placed'] > self.order_timeout:
+                        print(f"Cancelling {tracked['side']} order {order['order_id']} for {tracked['coin']}, "
+                              f"open for {now - tracked['placed']:.0f}s")
+                        self.stats['timed_out'] += 1
+                        self.request_cancel(order['order_id'])
+                continue
+            with self._lock:
+                tracked = self.open_orders.pop(order['order_id'], None)
+            if tracked is None:
+                continue
+            self.apply_fill(tracked, order)
+            closed.append(order)
+
+        # An order the exchange keeps not returning would block its coin and side for good
+        for order_id in order_ids:
+            if order_id in returned:
+                continue
+            with self._lock:
+                tracked = self.open_orders.get(order_id)
+                if tracked is None:
+                    continue
+                tracked['missing'] += 1
+                if tracked['missing'] < self.missing_polls:
+                    continue
+                del self.open_orders[order_id]
+            self.stats['lost'] += 1
+            print(f"Dropping {tracked['side']} order {order_id} for {tracked['coin']}: "
+                  f"not found in {tracked['missing']} status polls")
+        return closed
+
+    def _base_increment(self, product_id):
+        product = self.product_info(product_id) if self.product_info else None
+        try:
+            return float(product.get('base_increment') or 0) if product else 0.0
+        except (TypeError, ValueError):
+            return 0.0
+
+    def apply_fill(self, tracked, order):
+        filled_size = float(order.get('filled_size') or 0)
+        if filled_size <= 0:
+            self.stats['closed_unfilled'] += 1
+            print(f"Order {order['order_id']} for {tracked['coin']} closed without a fill: {order.get('status')}")
+            return
+
+        coin = tracked['coin']
+        price = float(order.get('average_filled_price') or 0)
+        fees = float(order.get('total_fees') or 0)
+        current = store.get(coin, {})
+        balance = current.get('balance', 0)
+        cost = current.get('current_cost_usd', -1)
+
+        # The account sync reports real balances; only apply the fill ourselves if it
+        # has not already picked this one up
+        apply_balance = self.synced_balance(coin) == tracked['synced_balance']
+
+        if tracked['side'] == 'BUY':
+            # Once the sync has counted the fill, the stored balance already includes it
+            prior = balance if apply_balance else max(balance - filled_size, 0.0)
+            if cost is not None and cost > 0 and prior > 0:
+                new_cost = (prior * cost + filled_size * price + fees) / (prior + filled_size)
+            else:
+                new_cost = (filled_size * price + fees) / filled_size
+            updates = {'current_cost_usd': new_cost}
+            if apply_balance:
+                updates['balance'] = balance + filled_size
+        else:
+            remaining = max(balance - filled_size, 0.0) if apply_balance else balance
+            net_price = price - fees / filled_size
+            updates = {'last_sale_price': net_price}
+            if cost is not None and cost > 0:
+                updates['realized_pnl'] = current.get('realized_pnl', 0.0) + (net_price - cost) * filled_size
+            # Sizes are floored to the increment when selling, so less than one increment
+            # left over is dust that can never be sold
+            if remaining <= 0 or remaining < self._base_increment(tracked['product_id']):
+                updates['balance'] = 0.0
+                updates['current_cost_usd'] = -1  # Reset cost after the position is closed
+            elif apply_balance:
+                updates['balance'] = remaining
+
+        store.update(coin, updates)
+        self.stats['filled'] += 1
+        print(f"{tracked['side'].title()} order {order['order_id']} for {coin} filled: "
+              f"{filled_size} at {price} (fees {fees})")
+
+
+order_tracker = OrderTracker(get_orders, cancel_orders, lambda coin: account_sync.balances.get(coin),
+                             product_info=lambda product_id: get_product_catalog().peek(product_id))
+
+
+async def settle_orders(client):
+    # Cancels requested since the last pass go out as one batch, then every open order
+    # is checked in one status request
+    await client.call('orders', order_tracker.flush_cancels)
+    return await client.call('orders', order_tracker.poll)
@@ -0,0 +1,271 @@
+import argparse
+import bisect
+import itertools
+import math
+import random
+import time
+from collections import deque
+from products import untradable_reason
+
+DEFAULT_BASE_INCREMENT = 1e-8
+DEFAULT_QUOTE_INCREMENT = 0.01
+
+
+def _floor(value, increment):
+    return math.floor(value / increment + 1e-9) * increment
+
+
+class OrderBook:
+    # Resting limit orders for one product: a sorted list of price levels per side
+    # plus a FIFO queue per level, so the best level is O(1) and inserts are a bisect
+    def __init__(self):
+        self.bid_prices = []  # Ascending, best bid is the last element
+        self.ask_prices = []  # Ascending, best ask is the first element
+        self.bids = {}
+        self.asks = {}
+
+    def add(self, order):
+        prices, levels = (self.bid_prices, self.bids) if order['side'] == 'BUY' else (self.ask_prices, self.asks)
+        level = levels.get(order['limit_price'])
+        if level is None:
+            level = levels[order['limit_price']] = deque()
+            bisect.insort(prices, order['limit_price'])
+        level.append(order['order_id'])
+
+    def remove(self, order):
+        prices, levels = (self.bid_prices, self.bids) if order['side'] == 'BUY' else (self.ask_prices, self.asks)
+        level = levels.get(order['limit_price'])
+        if level is None:
+            return
+        try:
+            level.remove(order['order_id'])
+        except ValueError:
+            return
+        if not level:
+            del levels[order['limit_price']]
+            del prices[bisect.bisect_left(prices, order['limit_price'])]
+
+    def crossed(self, bid, ask):
+        # Buy limits at or above the ask and sell limits at or below the bid can fill
+        filled = []
+        while ask is not None and self.bid_prices and self.bid_prices[-1] >= ask:
+            price = self.bid_prices.pop()
+            filled.extend(self.bids.pop(price))
+        while bid is not None and self.ask_prices and self.ask_prices[0] <= bid:
+            price = self.ask_prices.pop(0)
+            filled.extend(self.asks.pop(price))
+        return filled
+
+    def depth(self):
+        return sum(map(len, self.bids.values())), sum(map(len, self.asks.values()))
+
+
+class PaperExchange:
+    def __init__(self, balances=None, fee_percent=0.5, quote_currency="USD", product_info=None, clock=time.time):
+        self.balances = dict(balances or {quote_currency: 10000.0})
+        self.holds = {}
+        self.fee_rate = fee_percent / 100
+        self.quote_currency = quote_currency
+        self.product_info = product_info
+        self.clock = clock
+        self.quotes = {}
+        self.books = {}
+        self.orders = {}
+        self._order_ids = itertools.count(1)
+        self.stats = {'orders': 0, 'fills': 0, 'rejects': 0, 'cancels': 0, 'fees': 0.0}
+
+    def _increments(self, product_id):
+        product = self.product_info(product_id) if self.product_info else None
+        if product:
+            return float(product.get('base_increment') or DEFAULT_BASE_INCREMENT), \
+                float(product.get('quote_increment') or DEFAULT_QUOTE_INCREMENT), \
+                float(product.get('base_min_size') or 0)
+        return DEFAULT_BASE_INCREMENT, DEFAULT_QUOTE_INCREMENT, 0.0
+
+    def _untradable(self, product_id, market):
+        product = self.product_info(product_id) if self.product_info else None
+        return untradable_reason(product, market) if product else None
+
+    def _available(self, currency):
+        return self.balances.get(currency, 0.0) - self.holds.get(currency, 0.0)
+
+    def _reject(self, reason):
+        self.stats['rejects'] += 1
+        return False, None, {'error': reason}
+
+    def _new_order(self, product_id, side, order_type, size, limit_price=None):
+        order = {
+            'order_id': f"paper-{next(self._order_ids)}",
+            'product_id': product_id,
+            'side': side,
+            'order_type': order_type,
+            'base_size': size,
+            'limit_price': limit_price,
+            'status': 'OPEN',
+            'filled_size': 0.0,
+            'average_filled_price': 0.0,
+            'total_fees': 0.0,
+            'created_time': self.clock(),
+        }
+        self.orders[order['order_id']] = order
+        self.stats['orders'] += 1
+        return order
+
+    def _fill(self, order, price):
+        base, quote = order['product_id'].split("-")
+        size = order['base_size']
+        notional = size * price
+        fee = notional * self.fee_rate
+        if order['side'] == 'BUY':
+            self.balances[quote] = self.balances.get(quote, 0.0) - notional - fee
+            self.balances[base] = self.balances.get(base, 0.0) + size
+        else:
+            self.balances[base] = self.balances.get(base, 0.0) - size
+            self.balances[quote] = self.balances.get(quote, 0.0) + notional - fee
+        order.update(status='FILLED', filled_size=size, average_filled_price=price, total_fees=fee,
+                     completion_time=self.clock())
+        self.stats['fills'] += 1
+        self.stats['fees'] += fee
+
+    def _release(self, order):
+        base, quote = order['product_id'].split("-")
+        if order['side'] == 'BUY':
+            self.holds[quote] -= order['base_size'] * order['limit_price'] * (1 + self.fee_rate)
+        else:
+            self.holds[base] -= order['base_size']
+
+    def on_quote(self, product_id, quote):
+        self.quotes[product_id] = quote
+        book = self.books.get(product_id)
+        if book is None:
+            return
+        for order_id in book.crossed(quote.get('bid'), quote.get('ask')):
+            order = self.orders[order_id]
+            self._release(order)
+            # A limit order never fills worse than its limit, but takes a better quote when one is there
+            if order['side'] == 'BUY':
+                self._fill(order, min(order['limit_price'], quote['ask']))
+            else:
+                self._fill(order, max(order['limit_price'], quote['bid']))
+
+    def place_market_order(self, product_id, side, usd_order_size=None, size=None, current_price=None):
+        quote = self.quotes.get(product_id, {})
+        bid = quote.get('bid') or quote.get('price') or current_price
+        ask = quote.get('ask') or quote.get('price') or current_price
+        price = ask if side == 'BUY' else bid
+        if price is None:
+            return self._reject("Unable to fetch current price")
+        if self._untradable(product_id, market=True):
+            return self._reject("PRODUCT_NOT_TRADABLE")
+
+        base_increment, _, min_size = self._increments(product_id)
+        order_size = usd_order_size / price if usd_order_size else size
+        if size and order_size > size:
+            order_size = size
+        order_size = _floor(order_size, base_increment)
+        if order_size <= 0 or order_size < min_size:
+            return self._reject("INVALID_SIZE")
+
+        base, quote_currency = product_id.split("-")
+        if side == 'BUY' and self._available(quote_currency) < order_size * price * (1 + self.fee_rate):
+            return self._reject("INSUFFICIENT_FUND")
+        if side == 'SELL' and self._available(base) < order_size - 1e-12:
+            return self._reject("INSUFFICIENT_FUND")
+
+        order = self._new_order(product_id, side, 'MARKET', order_size)
+        self._fill(order, price)
+        return True, order['order_id'], {}
+
+    def place_limit_order(self, product_id, side, base_size, limit_price):
+        base_increment, quote_increment, min_size = self._increments(product_id)
+        size = _floor(base_size, base_increment)
+        limit_price = round(_floor(limit_price, quote_increment), 12)
+        if size <= 0 or size < min_size or limit_price <= 0:
+            return self._reject("INVALID_SIZE")
+        if self._untradable(product_id, market=False):
+            return self._reject("PRODUCT_NOT_TRADABLE")
+
+        base, quote_currency = product_id.split("-")
+        if side == 'BUY':
+            required = size * limit_price * (1 + self.fee_rate)
+            if self._available(quote_currency) < required:
+                return self._reject("INSUFFICIENT_FUND")
+            self.holds[quote_currency] = self.holds.get(quote_currency, 0.0) + required
+        else:
+            if self._available(base) < size - 1e-12:
+                return self._reject("INSUFFICIENT_FUND")
+            self.holds[base] = self.holds.get(base, 0.0) + size
+
+        order = self._new_order(product_id, side, 'LIMIT', size, limit_price)
+        self.books.setdefault(product_id, OrderBook()).add(order)
+        # A marketable limit order fills straight away against the latest quote
+        if product_id in self.quotes:
+            self.on_quote(product_id, self.quotes[product_id])
+        return True, order['order_id'], {}
+
+    def cancel_order(self, order_id):
+        order = self.orders.get(order_id)
+        if order is None or order['status'] != 'OPEN':
+            return False
+        self.books[order['product_id']].remove(order)
+        self._release(order)
+        order['status'] = 'CANCELLED'
+        self.stats['cancels'] += 1
+        return True
+
+    def get_accounts(self):
+        return [{
+            'uuid': f"paper-{currency}",
+            'name': f"{currency} Wallet",
+            'currency': currency,
+            'available_balance': {'value': str(self._available(currency)), 'currency': currency},
+            'hold': {'value': str(self.holds.get(currency, 0.0)), 'currency': currency},
+        } for currency in self.balances]
+
+    def get_order(self, order_id):
+        return self.orders.get(order_id)
+
+
+def soak(orders, products, limit_share, seed=None):
+    # Random market and limit flow against a random-walk feed, to measure raw throughput
+    generator = random.Random(seed)
+    product_ids = [f"P{index}-USD" for index in range(products)]
+    exchange = PaperExchange(balances={'USD': 1e12, **{product_id.split("-")[0]: 1e9 for product_id in product_ids}})
+    prices = {product_id: generator.uniform(1, 1000) for product_id in product_ids}
+    open_orders = deque()
+
+    started = time.perf_counter()
+    for index in range(orders):
+        product_id = product_ids[index % products]
+        price = prices[product_id] = prices[product_id] * (1 + generator.gauss(0, 0.001))
+        exchange.on_quote(product_id, {'bid': price * 0.9995, 'ask': price * 1.0005, 'price': price})
+        side = 'BUY' if generator.random() < 0.5 else 'SELL'
+        if generator.random() < limit_share:
+            offset = generator.uniform(-0.01, 0.01)
+            success, order_id, _ = exchange.place_limit_order(product_id, side, 0.01, price * (1 + offset))
+            if success:
+                open_orders.append(order_id)
+            if len(open_orders) > 1000:
+                exchange.cancel_order(open_orders.popleft())
+        else:
+            exchange.place_market_order(product_id, side, usd_order_size=100)
+    elapsed = time.perf_counter() - started
+    return elapsed, exchange
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test the paper exchange with random order flow")
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--limit-share", type=float, default=0.5, help="Fraction of orders that are limit orders")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    elapsed, exchange = soak(args.orders, args.products, args.limit_share, args.seed)
+    print(f"{args.orders} orders in {elapsed:.2f}s ({args.orders / elapsed:,.0f} orders/s)")
+    print(f"Fills: {exchange.stats['fills']}, rejects: {exchange.stats['rejects']}, "
+          f"cancels: {exchange.stats['cancels']}, fees: {exchange.stats['fees']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+PRODUCT_FIELDS = [
+    'product_id',
+    'base_increment',
+    'quote_increment',
+    'base_min_size',
+    'base_max_size',
+    'quote_min_size',
+    'quote_max_size',
+    'status',
+    'trading_disabled',
+    'is_disabled',
+    'cancel_only',
+    'limit_only',
+    'post_only',
+]
+
+MISS_REFRESH_INTERVAL = 300  # Minimum seconds between reloads triggered by an unknown product_id
+
+
+def untradable_reason(product, market=False):
+    # Why an order for this product would be rejected, or None when it can be placed
+    if product.get('status', 'online') != 'online':
+        return f"product is {product.get('status')}"
+    if product.get('trading_disabled') or product.get('is_disabled'):
+        return "trading is disabled"
+    if product.get('cancel_only'):
+        return "product is cancel-only"
+    if market and product.get('limit_only'):
+        return "product only accepts limit orders"
+    return None
+
+
+class ProductCatalog:
+    def __init__(self, fetch_products, ttl=3600, cache_file="data/products.json"):
+        self.fetch_products = fetch_products
+        self.ttl = ttl
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.products = {}
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # One download at a time, however many callers need it
+        self._refresh_thread = None
+        self._stop = threading.Event()
+
+    def _load_from_disk(self):
+        if self.cache_file is None or not self.cache_file.exists():
+            return False
+        try:
+            with open(self.cache_file, "r") as f:
+                cached = json.load(f)
+            self.products = cached['products']
+            self.loaded_at = cached['loaded_at']
+            return True
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable product cache {self.cache_file}: {e}")
+            return False
+
+    def _save_to_disk(self):
+        if self.cache_file is None:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Per-process temp name: shard workers share one product cache
+        tmp_file = self.cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump({'loaded_at': self.loaded_at, 'products': self.products}, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def refresh(self, max_age=None):
+        # With max_age, callers that waited on another caller's download use its result
+        # instead of fetching the catalog again
+        with self._refresh_lock:
+            if max_age is not None and time.time() - self.loaded_at <= max_age:
+                return
+            products = {}
+            for product in self.fetch_products():
+                products[product['product_id']] = {field: product.get(field) for field in PRODUCT_FIELDS}
+            with self._lock:
+                self.products = products
+                self.loaded_at = time.time()
+            try:
+                self._save_to_disk()
+            except OSError as e:
+                print(f"Could not write product cache {self.cache_file}: {e}")
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if not self.products:
+                self._load_from_disk()
+            expired = time.time() - self.loaded_at > self.ttl
+        if expired:
+            try:
+                self.refresh(max_age=self.ttl)
+            except Exception as e:
+                # A stale catalog is still good enough for increments and sizes
+                if not self.products:
+                    raise
+                print(f"Error refreshing product catalog, using cached copy: {e}")
+
+    def get(self, product_id):
+        self._ensure_loaded()
+        product = self.products.get(product_id)
+        if product is None and time.time() - self.loaded_at > MISS_REFRESH_INTERVAL:
+            self.refresh(max_age=MISS_REFRESH_INTERVAL)
+            product = self.products.get(product_id)
+        return product
+
+    def peek(self, product_id):
+        # Offline lookup: whatever is in memory or on disk, never a download
+        with self._lock:
+            if not self.products:
+                self._load_from_disk()
+            return self.products.get(product_id)
+
+    def is_tradable(self, product_id, market=False):
+        product = self.get(product_id)
+        return product is not None and untradable_reason(product, market) is None
+
+    def start_background_refresh(self):
+        if self._refresh_thread is not None:
+            return
+
+        def refresh_loop():
+            while not self._stop.wait(max(self.ttl - (time.time() - self.loaded_at), 1)):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"Error refreshing product catalog: {e}")
+
+        self._refresh_thread = threading.Thread(target=refresh_loop, daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,131 @@
+import asyncio
+import math
+import time
+import numpy as np
+from collections import Counter
+from multiprocessing import shared_memory
+
+# One row per product slot: a sequence number that is odd while the row is being
+# written, then the quote itself. Row 0 is a header whose first field counts publishes.
+FIELDS = 5
+SEQ, TIME, BID, ASK, LAST = range(FIELDS)
+STALE_AFTER = 120  # Seconds before a published quote is no longer served by snapshot()
+POLL_INTERVAL = 0.05  # Seconds between checks for new publishes while waiting
+
+
+class QuoteBoard:
+    # Latest quote per product in shared memory, written by one process and read by many
+    # without locks (a seqlock per row), so every shard sees one market-data feed
+    def __init__(self, capacity=None, name=None):
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=(capacity + 1) * FIELDS * 8)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.rows = np.ndarray((self.memory.size // (FIELDS * 8), FIELDS), dtype=np.float64, buffer=self.memory.buf)
+        if self.owner:
+            self.rows[:] = 0.0
+        self.capacity = len(self.rows) - 1
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    @property
+    def generation(self):
+        return int(self.rows[0, SEQ])
+
+    def publish(self, slot, quote):
+        row = self.rows[slot + 1]
+        row[SEQ] += 1
+        row[TIME] = quote.get('time') or time.time()
+        row[BID] = quote['bid'] if quote.get('bid') is not None else np.nan
+        row[ASK] = quote['ask'] if quote.get('ask') is not None else np.nan
+        row[LAST] = quote['last'] if quote.get('last') is not None else np.nan
+        row[SEQ] += 1
+        self.rows[0, SEQ] += 1
+
+    def sequence(self, slot):
+        return int(self.rows[slot + 1, SEQ])
+
+    def read(self, slot):
+        row = self.rows[slot + 1]
+        while True:
+            before = row[SEQ]
+            if before % 2:
+                continue  # Mid-write
+            values = row.copy()
+            if row[SEQ] == before:
+                break
+        if before == 0:
+            return None
+        quote = {
+            'bid': None if math.isnan(values[BID]) else float(values[BID]),
+            'ask': None if math.isnan(values[ASK]) else float(values[ASK]),
+            'last': None if math.isnan(values[LAST]) else float(values[LAST]),
+            'time': float(values[TIME]),
+        }
+        quote['price'] = quote['bid'] if quote['bid'] is not None else quote['last']
+        return quote
+
+    def close(self):
+        self.rows = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class BoardFeed:
+    # Reads a QuoteBoard through the same interface as MarketDataFeed, so a shard runs
+    # the normal stream-mode trading loop on prices published by the supervisor
+    def __init__(self, board, slots, stale_after=STALE_AFTER):
+        self.board = board
+        self.slots = dict(slots)
+        self.product_ids = list(self.slots)
+        self.stale_after = stale_after
+        self.seen = {}
+        self.updates = Counter()  # Quotes handed to the trading loop, per product
+
+    def assign(self, slots):
+        self.slots = dict(slots)
+        self.seen = {product_id: sequence for product_id, sequence in self.seen.items() if product_id in self.slots}
+
+    def set_products(self, product_ids):
+        self.product_ids = [product_id for product_id in product_ids if product_id in self.slots]
+
+    def snapshot(self, product_ids=None):
+        now = time.time()
+        quotes = {}
+        for product_id in self.product_ids if product_ids is None else product_ids:
+            slot = self.slots.get(product_id)
+            quote = self.board.read(slot) if slot is not None else None
+            if quote is not None and now - quote['time'] <= self.stale_after:
+                quotes[product_id] = quote
+        return quotes
+
+    def drain_updates(self):
+        updated = {}
+        for product_id in self.product_ids:
+            slot = self.slots[product_id]
+            sequence = self.board.sequence(slot)
+            if sequence and sequence != self.seen.get(product_id):
+                quote = self.board.read(slot)
+                if quote is not None:
+                    updated[product_id] = quote
+                    self.seen[product_id] = sequence
+                    self.updates[product_id] += 1
+        return updated
+
+    async def next_prices(self, timeout=None):
+        generation = self.board.generation
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self.board.generation == generation:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(POLL_INTERVAL)
+        return True
+
+    async def run(self):
+        # Nothing to connect to; publishing happens in the supervisor
+        await asyncio.Event().wait()
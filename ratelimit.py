@@ -0,0 +1,116 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# Lower values are served first when requests are queued behind the limiter
+PRIORITY_ORDER = 0
+PRIORITY_ACCOUNT = 1
+PRIORITY_PRICE = 2
+PRIORITY_BACKFILL = 3
+
+# Coinbase Advanced Trade REST limits: 30 requests/second per key for private
+# endpoints, 10 requests/second per IP for the public /market endpoints
+PRIVATE_RATE = 30
+PUBLIC_RATE = 10
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        # Never below one token, or a rate under 1/s would never have a token to give
+        self.capacity = max(burst or rate, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, now):
+        # Seconds until a token is available, without taking it
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        # Returns 0 when a token was taken, otherwise the seconds until one is available
+        wait = self.wait_time(now)
+        if wait == 0:
+            self.tokens -= 1
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, rate, burst=None):
+        self.bucket = TokenBucket(rate, burst)
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self.stats = {
+            'requests': 0,
+            'throttled': 0,
+            'throttle_seconds': 0.0,
+            'max_queue_depth': 0,
+            'backoffs': 0,
+        }
+
+    def acquire(self, priority=PRIORITY_PRICE):
+        started = time.monotonic()
+        with self._condition:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            self._condition.notify_all()  # A more urgent request may now be at the head
+            self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], len(self._waiters))
+            while True:
+                if self._waiters[0] == entry:
+                    wait = self.bucket.take(time.monotonic())
+                    if wait == 0:
+                        heapq.heappop(self._waiters)
+                        self._condition.notify_all()
+                        break
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+
+            waited = time.monotonic() - started
+            self.stats['requests'] += 1
+            if waited > 0.001:
+                self.stats['throttled'] += 1
+                self.stats['throttle_seconds'] += waited
+        return waited
+
+    def pause(self, seconds):
+        # The exchange told us to back off, so nobody sends until the window passes
+        with self._condition:
+            self.bucket.blocked_until = max(self.bucket.blocked_until, time.monotonic() + seconds)
+            self.bucket.tokens = 0.0
+            self.stats['backoffs'] += 1
+            self._condition.notify_all()
+
+    def queue_depth(self):
+        with self._condition:
+            return len(self._waiters)
+
+    def metrics(self):
+        with self._condition:
+            return dict(self.stats, queue_depth=len(self._waiters))
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0, retry_after=None):
+    # Full-jitter exponential backoff, never shorter than the server's Retry-After
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def parse_retry_after(value):
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
@@ -0,0 +1,101 @@
+import heapq
+import math
+import time
+from ratelimit import TokenBucket
+
+MIN_INTERVAL = 5  # Seconds between polls of a coin right at its sale threshold or loss limit
+MAX_INTERVAL = 300  # Seconds between polls of a quiet coin with no position
+IDLE_FACTOR = 4  # Coins without a position are polled this many times less often
+NEAR_MOVES = 4  # A threshold this many typical moves away is polled at the base interval
+PRICE_REQUEST_BUDGET = 2  # Price requests per second, leaving the rest of the limit to orders
+BATCH_SIZE = 100  # Products one bulk price request covers
+
+
+class CoinScheduler:
+    # Keeps one due time per product in a heap, so each coin is polled on its own
+    # cadence and a pass only fetches the products that are actually due
+    def __init__(self, base_interval=60, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 request_budget=PRICE_REQUEST_BUDGET, batch_size=BATCH_SIZE, clock=time.monotonic):
+        self.base_interval = base_interval
+        self.min_interval = min(min_interval, base_interval)
+        self.max_interval = max(max_interval, base_interval)
+        self.batch_size = batch_size
+        self.clock = clock
+        self.budget = TokenBucket(request_budget)
+        self.budget.updated = clock()
+        self.heap = []
+        self.due = {}
+        self.intervals = {}
+        self.stats = {'polled': 0, 'deferred': 0}
+
+    def set_products(self, product_ids):
+        now = self.clock()
+        for product_id in product_ids:
+            if product_id not in self.due:
+                self.schedule(product_id, now)
+        for product_id in set(self.due) - set(product_ids):
+            del self.due[product_id]  # Its heap entry is skipped when popped
+            self.intervals.pop(product_id, None)
+
+    def schedule(self, product_id, due):
+        self.due[product_id] = due
+        heapq.heappush(self.heap, (due, product_id))
+
+    def pop_due(self):
+        # Every due product, cut down to what the request budget allows right now;
+        # the rest stay at the head of the heap for the next pass
+        now = self.clock()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            when, product_id = heapq.heappop(self.heap)
+            if self.due.get(product_id) == when:
+                due.append(product_id)
+
+        allowed = 0
+        while allowed < len(due) and self.budget.take(now) == 0:
+            allowed += self.batch_size
+        for product_id in due[allowed:]:
+            heapq.heappush(self.heap, (self.due[product_id], product_id))
+        self.stats['deferred'] += max(len(due) - allowed, 0)
+        due = due[:allowed]
+        self.stats['polled'] += len(due)
+        return due
+
+    def wait_time(self, limit=None):
+        now = self.clock()
+        while self.heap and self.due.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        wait = max(self.heap[0][0] - now, 0.0) if self.heap else self.base_interval
+        if self.heap and wait == 0:
+            wait = self.budget.wait_time(now)  # Due, but possibly over budget
+        return min(wait, limit) if limit is not None else wait
+
+    def interval_for(self, price, cost=None, balance=0, sale_threshold=10, loss_limit=None, volatility=None):
+        # volatility is the typical price move as a fraction of the price
+        if price is None or not balance or cost is None or cost <= 0:
+            interval = self.base_interval * IDLE_FACTOR
+            if volatility:
+                interval /= max(1.0, volatility * 100)
+            return min(max(interval, self.base_interval), self.max_interval)
+
+        margin = (price - cost) / cost * 100
+        distance = sale_threshold - margin
+        if loss_limit is not None:
+            distance = min(distance, margin + loss_limit)
+        distance = max(distance, 0.0)
+        move = max((volatility or 0.0) * 100, 0.05)  # Percentage points per poll, floored for flat markets
+        interval = self.base_interval * distance / (move * NEAR_MOVES)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def reschedule(self, product_id, interval):
+        if product_id not in self.due:
+            return
+        self.intervals[product_id] = interval
+        self.schedule(product_id, self.clock() + interval)
+
+
+def volatility_of(stddev, price, window=20):
+    # The Bollinger standard deviation spans the whole window; scale it to a single step
+    if not stddev or not price:
+        return None
+    return stddev / price / math.sqrt(window)
@@ -1,36 +1,18 @@
-from coinbase import place_market_order
-from config import load_coins_settings, update_coins_settings
+from state import store
+from orders import order_tracker
 
-def sell_coin(coin):
-    coins_settings = load_coins_settings()
-    base_size = coins_settings[coin]['balance']
+async def sell_coin(client, coin):
+    if order_tracker.has_open(coin, 'SELL'):
+        return  # The last sell has not settled yet
+    base_size = store.get(coin, {}).get('balance', 0)
 
     if base_size > 0:
         print(f"Selling {coin}: Testing sale with unknown cost.")
-        success, order_id, error = place_market_order(f"{coin}-USD", 'SELL', size=base_size)
+        success, order_id, error = await client.place_market_order(f"{coin}-USD", 'SELL', size=base_size)
 
         if success:
             print(f"Sell order placed successfully for {coin}, order ID: {order_id}")
-            # Update the coin settings after a successful sale
-            coins_settings[coin]['balance'] -= base_size
-            coins_settings[coin]['current_cost_usd'] = -1  # Reset cost after sale
-            update_coins_settings(coins_settings)
+            # Balance and cost are updated from the actual fill once the order settles
+            order_tracker.track(order_id, f"{coin}-USD", 'SELL', coin)
         else:
             print(f"Failed to place sell order for {coin}: {error}")
-
-def check_sell_opportunities():
-    coins_settings = load_coins_settings()
-
-    for coin, settings in coins_settings.items():
-        if settings['enabled']:
-            trend_status = settings.get('trend_status', 'none')
-            current_price = settings['current_price']
-            current_cost = settings['current_cost_usd']
-            balance = settings['balance']
-
-            if trend_status == 'upward' and current_cost != -1:
-                profit_margin = ((current_price - current_cost) / current_cost) * 100
-                if profit_margin >= settings.get('sale_threshold', 10):
-                    sell_coin(coin)
-            elif current_cost == -1:
-                sell_coin(coin)
@@ -0,0 +1,86 @@
+import time
+import numpy as np
+from coinbase import quote_price
+from strategy import sell_mask
+from buying import BUY_INTERVAL
+
+BUY_ORDER_USD = 100  # Example buy amount per coin and pass
+MAX_POSITION_USD = 1000  # No more buys once a coin's holding is worth this much
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def pack_universe(coins_settings, quotes, settings, open_sides=frozenset(), now=None):
+    # One array per field over every enabled coin, so the decision rules run once for
+    # the whole universe instead of once per coin
+    coins = [coin for coin, details in coins_settings.items() if details.get('enabled', False)]
+    count = len(coins)
+    default_threshold = settings.get('sale_threshold', 10)
+    default_loss_limit = settings.get('loss_limit')
+
+    quoted = np.zeros(count, dtype=bool)
+    price = np.full(count, np.nan)
+    for index, coin in enumerate(coins):
+        quote_value = quote_price(quotes.get(f"{coin}-USD"))
+        if quote_value is not None:
+            quoted[index] = True
+            price[index] = quote_value
+        else:
+            price[index] = _float(coins_settings[coin].get('current_price'))
+
+    def field(name, default=np.nan):
+        return np.fromiter((_float(coins_settings[coin].get(name, default)) for coin in coins), dtype=float,
+                           count=count)
+
+    return {
+        'coins': coins,
+        'price': price,
+        'quoted': quoted,
+        'cost': field('current_cost_usd', -1),
+        'balance': field('balance', 0),
+        'trend_up': np.fromiter((coins_settings[coin].get('trend_status') == 'upward' for coin in coins),
+                                dtype=bool, count=count),
+        'sale_threshold': field('sale_threshold', default_threshold),
+        'loss_limit': field('loss_limit', default_loss_limit if default_loss_limit is not None else np.nan),
+        'selling': np.fromiter(((coin, 'SELL') in open_sides for coin in coins), dtype=bool, count=count),
+        'buying': np.fromiter(((coin, 'BUY') in open_sides for coin in coins), dtype=bool, count=count),
+        'last_buy': field('last_buy_time', 0),
+        'now': time.time() if now is None else now,
+        'buy_interval': settings.get('buy_interval', BUY_INTERVAL),
+        'max_position_usd': settings.get('max_position_usd', MAX_POSITION_USD) or np.inf,
+    }
+
+
+def evaluate_signals(universe, usd_order_size=BUY_ORDER_USD):
+    price = universe['price']
+    cost = universe['cost']
+    balance = universe['balance']
+
+    # Take profit on an upward trend or cut a loss; a position with an unknown cost
+    # (-1) is sold outright. A NaN loss limit never triggers.
+    with np.errstate(invalid='ignore'):
+        sell = sell_mask(price, cost, universe['trend_up'], universe['sale_threshold'], universe['loss_limit'])
+    sell |= cost == -1
+    sell &= (balance > 0) & ~universe['selling']
+
+    # A coin is bought at most once per buy_interval and only while its holding, plus
+    # this order, stays within max_position_usd
+    with np.errstate(invalid='ignore'):
+        position = np.where(balance > 0, balance * price, 0.0)
+        buy = universe['quoted'] & ~universe['buying']
+        buy &= universe['now'] - universe['last_buy'] >= universe['buy_interval']
+        buy &= position + usd_order_size <= universe['max_position_usd']
+
+    coins = universe['coins']
+    orders = [{'coin': coins[index], 'product_id': f"{coins[index]}-USD", 'side': 'SELL',
+               'size': float(balance[index]), 'current_price': float(price[index])}
+              for index in np.flatnonzero(sell)]
+    orders += [{'coin': coins[index], 'product_id': f"{coins[index]}-USD", 'side': 'BUY',
+                'usd_order_size': usd_order_size, 'current_price': float(price[index])}
+               for index in np.flatnonzero(buy)]
+    return orders
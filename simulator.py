@@ -0,0 +1,315 @@
+import argparse
+import json
+import math
+import random
+import secrets
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+API_PREFIX = "/api/v3/brokerage"
+ACCOUNTS_PAGE_LIMIT = 250
+CANDLES_LIMIT = 350
+GRANULARITY_SECONDS = {'ONE_MINUTE': 60, 'FIVE_MINUTE': 300, 'FIFTEEN_MINUTE': 900, 'THIRTY_MINUTE': 1800,
+                       'ONE_HOUR': 3600, 'TWO_HOUR': 7200, 'SIX_HOUR': 21600, 'ONE_DAY': 86400}
+
+
+class ExchangeSimulator:
+    # Local stand-in for the Advanced Trade endpoints the bot uses, with configurable
+    # latency, error rate and rate limit so hot paths can be measured without keys
+    def __init__(self, coins=10, latency=0.0, latency_jitter=0.0, error_rate=0.0, rate_limit=None,
+                 volatility=0.002, seed=None, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.volatility = volatility
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.reset(coins)
+
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                simulator.handle(self, "GET")
+
+            def do_POST(self):
+                simulator.handle(self, "POST")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def host(self):
+        return f"{self.server.server_address[0]}:{self.server.server_address[1]}"
+
+    def reset(self, coins):
+        with self.lock:
+            self.products = {}
+            self.prices = {}
+            self.accounts = [self._account("USD", 1_000_000.0)]
+            for index in range(coins):
+                currency = f"SIM{index}"
+                product_id = f"{currency}-USD"
+                self.products[product_id] = {
+                    'product_id': product_id,
+                    'price': "0",
+                    'base_increment': "0.00000001",
+                    'quote_increment': "0.01",
+                    'base_min_size': "0.00000001",
+                    'base_max_size': "1000000",
+                    'quote_min_size': "1",
+                    'quote_max_size': "10000000",
+                    'status': "online",
+                    'trading_disabled': False,
+                    'is_disabled': False,
+                    'cancel_only': False,
+                    'limit_only': False,
+                    'post_only': False,
+                }
+                self.prices[product_id] = self.random.uniform(1, 1000)
+                self.accounts.append(self._account(currency, self.random.uniform(0, 10)))
+            self.orders = {}
+            self.requests.clear()
+
+    def _account(self, currency, balance):
+        return {
+            'uuid': secrets.token_hex(16),
+            'name': f"{currency} Wallet",
+            'currency': currency,
+            'available_balance': {'value': str(balance), 'currency': currency},
+            'active': True,
+            'type': "ACCOUNT_TYPE_CRYPTO",
+        }
+
+    def _tick(self, product_id):
+        price = self.prices[product_id] * math.exp(self.random.gauss(0, self.volatility))
+        self.prices[product_id] = price
+        return price
+
+    def _quote(self, product_id):
+        price = self._tick(product_id)
+        return price * 0.9995, price * 1.0005, price
+
+    def _throttled(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1:
+            self._window_start, self._window_count = now, 0
+        self._window_count += 1
+        return self._window_count > self.rate_limit
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        body = None
+        length = int(handler.headers.get('Content-Length') or 0)
+        if length:
+            body = json.loads(handler.rfile.read(length))
+
+        delay = self.latency + self.random.uniform(0, self.latency_jitter) if self.latency or self.latency_jitter else 0
+        if delay:
+            time.sleep(delay)
+
+        with self.lock:
+            endpoint = self._endpoint(url.path, method)
+            self.requests[endpoint] += 1
+            if self._throttled():
+                return self._send(handler, 429, {'error': "rate_limited"}, {'Retry-After': "1"})
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self._send(handler, 503, {'error': "unavailable"})
+            status, payload = self._route(endpoint, url.path, query, body)
+        self._send(handler, status, payload)
+
+    def _send(self, handler, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        handler.send_response(status)
+        handler.send_header('Content-Type', "application/json")
+        handler.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _endpoint(self, path, method):
+        path = path[len(API_PREFIX):] if path.startswith(API_PREFIX) else path
+        if path.startswith("/products/") and path.endswith("/ticker"):
+            return "ticker"
+        if path.startswith("/products/") and path.endswith("/candles"):
+            return "candles"
+        if path == "/orders" and method == "POST":
+            return "create_order"
+        return path.strip("/").replace("/", "_") or "root"
+
+    def _route(self, endpoint, path, query, body):
+        if endpoint == "accounts":
+            return 200, self._accounts(query)
+        if endpoint == "ticker":
+            return self._ticker(path.split("/")[-2])
+        if endpoint == "candles":
+            return self._candles(path.split("/")[-2], query)
+        if endpoint == "best_bid_ask":
+            return 200, self._best_bid_ask(query.get('product_ids', []))
+        if endpoint == "products":
+            return 200, {'products': [dict(product, price=str(self.prices[product_id]))
+                                      for product_id, product in self.products.items()],
+                         'num_products': len(self.products)}
+        if endpoint == "create_order":
+            return 200, self._create_order(body)
+        if endpoint == "orders_batch_cancel":
+            return 200, self._cancel(body.get('order_ids', []))
+        if endpoint == "orders_historical_batch":
+            return 200, self._historical_orders(query.get('order_ids', []))
+        return 404, {'error': "NOT_FOUND", 'message': f"Unknown endpoint {path}"}
+
+    def _accounts(self, query):
+        limit = min(int(query.get('limit', [49])[0]), ACCOUNTS_PAGE_LIMIT)
+        start = int(query.get('cursor', [0])[0] or 0)
+        page = self.accounts[start:start + limit]
+        has_next = start + limit < len(self.accounts)
+        return {
+            'accounts': page,
+            'has_next': has_next,
+            'cursor': str(start + limit) if has_next else "",
+            'size': len(page),
+        }
+
+    def _ticker(self, product_id):
+        if product_id not in self.products:
+            return 404, {'error': "NOT_FOUND", 'message': f"Product {product_id} not found"}
+        bid, ask, last = self._quote(product_id)
+        return 200, {
+            'trades': [{'product_id': product_id, 'price': str(last), 'size': "1", 'side': "BUY",
+                        'time': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}],
+            'best_bid': str(bid),
+            'best_ask': str(ask),
+        }
+
+    def _candles(self, product_id, query):
+        if product_id not in self.products:
+            return 404, {'error': "NOT_FOUND", 'message': f"Product {product_id} not found"}
+        seconds = GRANULARITY_SECONDS.get(query.get('granularity', [""])[0])
+        if seconds is None:
+            return 400, {'error': "INVALID_ARGUMENT", 'message': "Unknown granularity"}
+        start = int(query.get('start', [0])[0])
+        end = int(query.get('end', [0])[0])
+        first = start - start % seconds + (seconds if start % seconds else 0)
+        buckets = range(first, min(end, int(time.time())) + 1, seconds)
+        if len(buckets) > CANDLES_LIMIT:
+            return 400, {'error': "INVALID_ARGUMENT",
+                         'message': f"number of candles requested should be less than {CANDLES_LIMIT}"}
+
+        # Seeded per product and bucket, so the same range always returns the same candles
+        candles = []
+        for bucket in reversed(buckets):
+            generator = random.Random(f"{product_id}:{seconds}:{bucket}")
+            center = self.prices[product_id] * (1 + 0.05 * math.sin(bucket / 86400))
+            open_price, close = (center * math.exp(generator.gauss(0, self.volatility)) for _ in range(2))
+            high = max(open_price, close) * (1 + abs(generator.gauss(0, self.volatility)))
+            low = min(open_price, close) * (1 - abs(generator.gauss(0, self.volatility)))
+            candles.append({'start': str(bucket), 'low': str(low), 'high': str(high), 'open': str(open_price),
+                            'close': str(close), 'volume': str(generator.uniform(0, 100))})
+        return 200, {'candles': candles}
+
+    def _best_bid_ask(self, product_ids):
+        pricebooks = []
+        for product_id in product_ids:
+            if product_id in self.products:
+                bid, ask, _ = self._quote(product_id)
+                pricebooks.append({
+                    'product_id': product_id,
+                    'bids': [{'price': str(bid), 'size': "1"}],
+                    'asks': [{'price': str(ask), 'size': "1"}],
+                    'time': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                })
+        return {'pricebooks': pricebooks}
+
+    def _create_order(self, body):
+        product_id = body.get('product_id')
+        if product_id not in self.products:
+            return {'success': False, 'error_response': {'error': "INVALID_PRODUCT_ID"}}
+        configuration = body.get('order_configuration', {})
+        order_type, details = next(iter(configuration.items()))
+        order_id = secrets.token_hex(16)
+        bid, ask, _ = self._quote(product_id)
+        size = float(details.get('base_size', 0))
+        market = order_type.startswith("market")
+        price = (ask if body['side'] == "BUY" else bid) if market else float(details['limit_price'])
+        self.orders[order_id] = {
+            'order_id': order_id,
+            'client_order_id': body.get('client_order_id'),
+            'product_id': product_id,
+            'side': body['side'],
+            'status': "FILLED" if market else "OPEN",
+            'filled_size': str(size if market else 0),
+            'average_filled_price': str(price if market else 0),
+            'total_fees': str(size * price * 0.006 if market else 0),
+            'order_configuration': configuration,
+        }
+        return {
+            'success': True,
+            'order_id': order_id,
+            'success_response': {'order_id': order_id, 'product_id': product_id, 'side': body['side'],
+                                 'client_order_id': body.get('client_order_id')},
+        }
+
+    def _cancel(self, order_ids):
+        results = []
+        for order_id in order_ids:
+            order = self.orders.get(order_id)
+            if order is not None and order['status'] == "OPEN":
+                order['status'] = "CANCELLED"
+                results.append({'success': True, 'order_id': order_id})
+            else:
+                results.append({'success': False, 'order_id': order_id, 'failure_reason': "UNKNOWN_CANCEL_ORDER"})
+        return {'results': results}
+
+    def _historical_orders(self, order_ids):
+        orders = [self.orders[order_id] for order_id in order_ids if order_id in self.orders]
+        return {'orders': orders, 'has_next': False, 'cursor': ""}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Coinbase Advanced Trade stand-in")
+    parser.add_argument("--coins", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="Extra random seconds, uniform")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--rate-limit", type=int, help="Requests per second before answering 429")
+    args = parser.parse_args()
+
+    simulator = ExchangeSimulator(coins=args.coins, latency=args.latency, latency_jitter=args.latency_jitter,
+                                  error_rate=args.error_rate, rate_limit=args.rate_limit, port=args.port)
+    print(f"Simulating {args.coins} products at http://{simulator.host}{API_PREFIX}")
+    print("Point settings.yaml at it with request_host and request_scheme: http")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
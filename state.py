@@ -0,0 +1,170 @@
+import atexit
+import copy
+import json
+import os
+import threading
+import yaml
+from pathlib import Path
+from metrics import timer
+
+
+class StateStore:
+    def __init__(self, snapshot_file="data/state.json", yaml_file="settings/coins_settings.yaml",
+                 flush_interval=5, export_interval=300):
+        self.snapshot_file = Path(snapshot_file)
+        self.yaml_file = Path(yaml_file)
+        self.flush_interval = flush_interval
+        self.export_interval = export_interval
+        self._coins = {}
+        self._exported = {}
+        self._yaml_mtime = None
+        self._loaded = False
+        self._dirty = False
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # One snapshot write at a time, they share a temp file
+        self._flush_thread = None
+        self._stop = threading.Event()
+        self.scope = None  # Coins this process trades; None means all of them
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            if self.snapshot_file.exists():
+                with open(self.snapshot_file, "r") as f:
+                    self._coins = json.load(f)
+            self._exported = copy.deepcopy(self._coins)
+            if self.yaml_file.exists():
+                if not self.snapshot_file.exists() or self.yaml_file.stat().st_mtime > self.snapshot_file.stat().st_mtime:
+                    self._import_yaml()
+                self._yaml_mtime = self.yaml_file.stat().st_mtime
+            self._loaded = True
+
+    def _import_yaml(self):
+        with timer('autocoin_state_io_seconds', operation="import_yaml"), open(self.yaml_file, "r") as f:
+            imported = yaml.safe_load(f) or {}
+        # Only take values that were edited by hand since the last export, so a stale
+        # YAML view never rolls back balances or prices updated in memory
+        for coin, fields in imported.items():
+            exported = self._exported.get(coin, {})
+            current = self._coins.setdefault(coin, {})
+            for key, value in (fields or {}).items():
+                if key not in exported or exported[key] != value:
+                    current[key] = value
+        self._exported = copy.deepcopy(imported)
+        self._dirty = True
+
+    def get(self, coin, default=None):
+        self._ensure_loaded()
+        with self._lock:
+            if coin not in self._coins:
+                return default
+            return copy.deepcopy(self._coins[coin])
+
+    def set_scope(self, coins):
+        with self._lock:
+            self.scope = set(coins) if coins is not None else None
+
+    def in_scope(self, coin):
+        scope = self.scope
+        return scope is None or coin in scope
+
+    def coins(self):
+        self._ensure_loaded()
+        with self._lock:
+            return {coin: copy.deepcopy(fields) for coin, fields in self._coins.items() if self.in_scope(coin)}
+
+    def enabled_coins(self):
+        self._ensure_loaded()
+        with self._lock:
+            return [coin for coin, fields in self._coins.items() if fields.get('enabled') and self.in_scope(coin)]
+
+    def update(self, coin, fields=None, **kwargs):
+        self._ensure_loaded()
+        with self._lock:
+            current = self._coins.setdefault(coin, {})
+            current.update(fields or {}, **kwargs)
+            self._dirty = True
+
+    def setdefaults(self, coin, defaults):
+        self._ensure_loaded()
+        with self._lock:
+            current = self._coins.setdefault(coin, {})
+            for key, value in defaults.items():
+                if key not in current:
+                    current[key] = value
+                    self._dirty = True
+
+    def adjust(self, coin, field, delta):
+        self._ensure_loaded()
+        with self._lock:
+            current = self._coins.setdefault(coin, {})
+            current[field] = current.get(field, 0) + delta
+            self._dirty = True
+            return current[field]
+
+    def flush(self):
+        self._ensure_loaded()
+        with self._write_lock:
+            with self._lock:
+                if self.yaml_file.exists() and self.yaml_file.stat().st_mtime != self._yaml_mtime:
+                    self._import_yaml()
+                    self._yaml_mtime = self.yaml_file.stat().st_mtime
+                if not self._dirty:
+                    return
+                data = json.dumps(self._coins, separators=(',', ':'))
+                self._dirty = False
+            try:
+                with timer('autocoin_state_io_seconds', operation="snapshot"):
+                    self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_file = self.snapshot_file.with_suffix(".tmp")
+                    with open(tmp_file, "w") as f:
+                        f.write(data)
+                    os.replace(tmp_file, self.snapshot_file)
+            except Exception:
+                with self._lock:
+                    self._dirty = True  # Nothing was saved, so the next flush tries again
+                raise
+
+    def export_yaml(self):
+        coins = self.coins()
+        self.yaml_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.yaml_file.with_suffix(".tmp")
+        with timer('autocoin_state_io_seconds', operation="export_yaml"), open(tmp_file, "w") as f:
+            yaml.dump(coins, f, default_flow_style=False, sort_keys=False)
+        with self._lock:
+            os.replace(tmp_file, self.yaml_file)
+            self._exported = coins
+            self._yaml_mtime = self.yaml_file.stat().st_mtime
+
+    def start(self):
+        if self._flush_thread is not None:
+            return
+
+        def flush_loop():
+            since_export = 0
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                    since_export += self.flush_interval
+                    if since_export >= self.export_interval:
+                        self.export_yaml()
+                        since_export = 0
+                except Exception as e:
+                    print(f"Error saving coin state: {e}")
+
+        self._flush_thread = threading.Thread(target=flush_loop, daemon=True)
+        self._flush_thread.start()
+        atexit.register(self.close)
+
+    def close(self):
+        self._stop.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+        self.flush()
+        self.export_yaml()
+
+
+store = StateStore()
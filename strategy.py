@@ -0,0 +1,47 @@
+import numpy as np
+
+SHORT_WINDOW = 10
+LONG_WINDOW = 30
+
+
+def sma(prices, window):
+    prices = np.asarray(prices, dtype=float)
+    result = np.full(len(prices), np.nan)
+    if len(prices) >= window:
+        sums = np.cumsum(np.concatenate(([0.0], prices)))
+        result[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return result
+
+
+def trend_up(prices, short_window=SHORT_WINDOW, long_window=LONG_WINDOW):
+    # Same rule as trends.check_price_trends: short SMA above long SMA, or while the
+    # long window is still filling, a rise since the previous price
+    prices = np.asarray(prices, dtype=float)
+    short, long = sma(prices, short_window), sma(prices, long_window)
+    rising = np.zeros(len(prices), dtype=bool)
+    rising[1:] = prices[1:] > prices[:-1]
+    warm = ~np.isnan(long)
+    return np.where(warm, short > long, rising)
+
+
+def profit_margin(price, cost):
+    price = np.asarray(price, dtype=float)
+    cost = np.asarray(cost, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(cost > 0, (price - cost) / cost * 100, np.nan)
+
+
+def sell_mask(price, cost, trend_up, sale_threshold, loss_limit=None):
+    # Take profit on an upward trend once the margin reaches sale_threshold,
+    # or cut the position when it has lost loss_limit percent
+    margin = profit_margin(price, cost)
+    sell = np.asarray(trend_up, dtype=bool) & (margin >= sale_threshold)
+    if loss_limit is not None:
+        sell |= margin <= -np.asarray(loss_limit, dtype=float)
+    return sell
+
+
+def floor_to_increment(size, increment):
+    increment = np.asarray(increment, dtype=float)
+    # The small epsilon keeps sizes that are already on the increment from rounding down a step
+    return np.floor(np.asarray(size, dtype=float) / increment + 1e-9) * increment
@@ -0,0 +1,501 @@
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import yaml
+from collections import Counter
+from pathlib import Path
+from config import (get_settings, reset_settings, KEY_NAME_ENV, KEY_SECRET_ENV, KEY_SECRET_FILE_ENV,
+                    PRIVATE_RATE_ENV, PUBLIC_RATE_ENV)
+from quoteboard import QuoteBoard, BoardFeed
+
+SHARD_DIRECTORY = "data/shards"
+BOARD_CAPACITY = 4096  # Products the shared quote board can hold
+REPORT_INTERVAL = 10  # Seconds between shard status reports
+REBALANCE_INTERVAL = 300  # Seconds between load rebalancing passes
+REBALANCE_RATIO = 1.5  # Move products once the busiest shard carries this much more load than the idlest
+ORDER_WEIGHT = 10  # An order costs about as much as this many price updates
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+STABLE_RUNTIME = 60  # Seconds a shard has to stay up before its restart delay is reset
+
+
+def partition(weights, shards):
+    # Heaviest products first, each onto the currently lightest shard
+    loads = [0.0] * shards
+    assignment = [set() for _ in range(shards)]
+    for product_id, weight in sorted(weights.items(), key=lambda item: (-item[1], item[0])):
+        index = min(range(shards), key=loads.__getitem__)
+        assignment[index].add(product_id)
+        loads[index] += weight
+    return assignment
+
+
+def rebalance(assignment, weights, locked=frozenset()):
+    # Moves single products from the busiest to the idlest shard while that narrows the
+    # gap, so a rebalance only disturbs the few products it has to
+    loads = {shard: sum(weights.get(product_id, 1.0) for product_id in products)
+             for shard, products in assignment.items()}
+    moves = []
+    while len(loads) > 1:
+        busiest = max(loads, key=loads.get)
+        idlest = min(loads, key=loads.get)
+        gap = loads[busiest] - loads[idlest]
+        if loads[busiest] <= REBALANCE_RATIO * loads[idlest]:
+            break
+        candidates = [product_id for product_id in assignment[busiest]
+                      if product_id not in locked and weights.get(product_id, 1.0) < gap]
+        if not candidates:
+            break
+        # Moving half the gap evens the pair out best
+        product_id = min(candidates, key=lambda candidate: abs(gap / 2 - weights.get(candidate, 1.0)))
+        assignment[busiest].discard(product_id)
+        assignment[idlest].add(product_id)
+        loads[busiest] -= weights.get(product_id, 1.0)
+        loads[idlest] += weights.get(product_id, 1.0)
+        moves.append((product_id, busiest, idlest))
+    return moves
+
+
+def _coin(product_id):
+    return product_id.split("-")[0]
+
+
+def _apply_key(key, environ=os.environ):
+    # Runs in the shard before settings are first read, so the key overrides settings.yaml.
+    # A spawned shard inherits the supervisor's environment, so whichever secret variable
+    # this key does not use is removed; otherwise another key's secret file would win.
+    if not key:
+        return
+    environ.pop(KEY_SECRET_ENV, None)
+    environ.pop(KEY_SECRET_FILE_ENV, None)
+    environ[KEY_NAME_ENV] = key['key_name']
+    if key.get('key_secret_file'):
+        environ[KEY_SECRET_FILE_ENV] = key['key_secret_file']
+    else:
+        environ[KEY_SECRET_ENV] = key['key_secret']
+
+
+def shared_rates(settings, shards):
+    # Shards and the price publisher share one key, so they split its rate limits
+    share = shards + 1
+    return {PRIVATE_RATE_ENV: str(settings.get('private_rate_limit', 30) / share),
+            PUBLIC_RATE_ENV: str(settings.get('public_rate_limit', 10) / share)}
+
+
+def adopt_history(product_id, source_directory, warm_granularity=None):
+    # Runs in the shard taking over a product: copies the ticks and candles its previous
+    # owner recorded after the newest ones held here, then rebuilds the indicators from them
+    from history import history, Series
+    from candles import candle_store, GRANULARITIES
+    from indicators import warm_engines
+
+    source_directory = Path(source_directory)
+    stores = [(source_directory, history)]
+    stores += [(source_directory / "candles", candle_store(granularity)) for granularity in GRANULARITIES]
+    copied = 0
+    for directory, target_store in stores:
+        path = directory / f"{product_id}{target_store.suffix}"
+        if not path.exists():
+            continue
+        # A shard's history files only grow and publish their record count last, so the
+        # previous owner's files can be read while it finishes its final pass
+        records = Series(path, dtype=target_store.dtype).all()
+        target = target_store.series(product_id)
+        last = target.last_timestamp()
+        if last is not None:
+            records = records[records['timestamp'] > last]
+        if len(records):
+            target.extend(records)
+            copied += len(records)
+        target.flush()
+    warm_engines(history, [product_id], candles=candle_store(warm_granularity) if warm_granularity else None)
+    return copied
+
+
+def shard_report(shard_id, feed):
+    from state import store
+    from coinbase import account_sync
+    from orders import order_tracker
+
+    load = Counter(feed.updates)
+    for product_id, count in order_tracker.placed.items():
+        load[product_id] += ORDER_WEIGHT * count
+    feed.updates.clear()
+    order_tracker.placed.clear()
+    return {
+        'shard': shard_id,
+        'pid': os.getpid(),
+        'time': time.time(),
+        'coins': store.coins(),
+        'wanted': [f"{coin}-USD" for coin in store.enabled_coins()],
+        'load': dict(load),
+        'open': sorted({coin for coin, _ in order_tracker.open_sides()}),
+        'cash': {currency: balance for currency, balance in account_sync.balances.items()
+                 if currency in ("USD", "USDC")},
+    }
+
+
+def run_shard(shard_id, spec, board_name, control, reports, report_interval=REPORT_INTERVAL):
+    # Entry point of a worker process: its own state file and price history under its
+    # directory, prices from the shared board, and the normal trading loop
+    _apply_key(spec.get('key'))
+    os.environ.update(spec.get('environment', {}))
+    directory = Path(spec['directory'])
+
+    from state import store
+    from history import history
+    from coinbase import get_product_catalog
+    from main import run
+
+    store.snapshot_file = directory / "state.json"
+    store.yaml_file = directory / "coins_settings.yaml"
+    history.directory = directory / "history"
+    store.set_scope(spec.get('scope'))
+    for coin, fields in spec.get('seed', {}).items():
+        store.setdefaults(coin, fields)
+
+    settings = get_settings()
+    store.flush_interval = settings.get('state_flush_interval', store.flush_interval)
+    store.start()
+    get_product_catalog().start_background_refresh()
+    feed = BoardFeed(QuoteBoard(name=board_name), spec['slots'])
+
+    async def report_loop():
+        while True:
+            await asyncio.sleep(report_interval)
+            reports.put(shard_report(shard_id, feed))
+
+    async def control_loop():
+        while True:
+            try:
+                message = await asyncio.to_thread(control.get, True, 1.0)
+            except queue.Empty:
+                continue
+            if 'slots' in message:
+                feed.assign(message['slots'])
+            for coin, fields in message.get('import', {}).items():
+                store.update(coin, fields)
+            # History comes over before the scope widens, so no new tick lands ahead of it
+            for product_id, source_directory in message.get('adopt', {}).items():
+                copied = await asyncio.to_thread(adopt_history, product_id, source_directory,
+                                                 settings.get('warm_granularity', "1m"))
+                print(f"Took over {product_id} with {copied} history records")
+            if 'scope' in message:
+                store.set_scope(message['scope'])
+
+    asyncio.run(run(settings, feed=feed, extra_tasks=(report_loop(), control_loop())))
+
+
+class Supervisor:
+    # Splits the bot across worker processes, either by product with one shared key or
+    # by portfolio with one key per shard. Market data is fetched once here and shared
+    # through a QuoteBoard; shards report back so balances and PnL can be aggregated.
+    def __init__(self, settings, shards=2, keys=None, directory=SHARD_DIRECTORY, report_interval=REPORT_INTERVAL,
+                 rebalance_interval=REBALANCE_INTERVAL, capacity=BOARD_CAPACITY):
+        self.settings = settings
+        self.keys = list(keys or [])
+        self.shards = len(self.keys) if self.keys else shards
+        self.by_product = not self.keys
+        self.directory = Path(directory)
+        self.report_interval = report_interval
+        self.rebalance_interval = rebalance_interval
+        self.capacity = capacity
+        self.context = multiprocessing.get_context("spawn")
+        self.reports = self.context.Queue()
+        self.workers = {}
+        self.assignment = {}
+        self.latest = {}
+        self.slots = {}
+        self.load = Counter()
+        self.board = None
+        self._stop = threading.Event()
+
+    def _slot(self, product_id):
+        slot = self.slots.get(product_id)
+        if slot is None:
+            if len(self.slots) >= self.capacity:
+                raise RuntimeError(f"Quote board is full ({self.capacity} products)")
+            slot = self.slots[product_id] = len(self.slots)
+        return slot
+
+    def _specs(self):
+        from state import store, StateStore
+
+        specs = {}
+        if self.by_product:
+            product_ids = [f"{coin}-USD" for coin in store.enabled_coins()]
+            for shard_id, products in enumerate(partition({product_id: 1.0 for product_id in product_ids},
+                                                          self.shards)):
+                self.assignment[shard_id] = products
+                specs[shard_id] = {'directory': str(self.directory / str(shard_id)),
+                                   'scope': sorted(map(_coin, products)),
+                                   'seed': {_coin(product_id): store.get(_coin(product_id)) for product_id in products}}
+        else:
+            for shard_id, key in enumerate(self.keys):
+                directory = self.directory / str(shard_id)
+                shard_store = StateStore(directory / "state.json", directory / "coins_settings.yaml")
+                self.assignment[shard_id] = {f"{coin}-USD" for coin in shard_store.enabled_coins()}
+                specs[shard_id] = {'directory': str(directory), 'scope': None, 'seed': {}, 'key': key}
+        if self.by_product:
+            # Every shard gets its key in the spec rather than through the environment it
+            # inherits, so what a shard signs with never depends on the supervisor's process
+            key = ({'key_name': self.settings['key_name'], 'key_secret': self.settings['key_secret']}
+                   if self.settings.has_credentials else None)
+            for spec in specs.values():
+                spec['key'] = key
+            environment = shared_rates(self.settings, self.shards)
+            for spec in specs.values():
+                spec['environment'] = environment
+        for products in self.assignment.values():
+            for product_id in sorted(products):
+                self._slot(product_id)
+        return specs
+
+    def _spawn(self, shard_id, spec):
+        spec = dict(spec, slots=dict(self.slots))
+        control = self.context.Queue()
+        process = self.context.Process(target=run_shard, name=f"shard-{shard_id}",
+                                       args=(shard_id, spec, self.board.name, control, self.reports,
+                                             self.report_interval), daemon=True)
+        process.start()
+        worker = self.workers.setdefault(shard_id, {'restarts': 0, 'delay': RESTART_DELAY, 'restart_at': None})
+        worker.update(process=process, control=control, spec=spec, started=time.time())
+        print(f"Started shard {shard_id} (pid {process.pid}) with {len(self.assignment.get(shard_id, ()))} products")
+
+    def _send(self, shard_id, message):
+        worker = self.workers.get(shard_id)
+        if worker and worker['process'].is_alive():
+            worker['control'].put(message)
+
+    def _publish_loop(self):
+        from coinbase import get_price_snapshot, generate_jwt
+        from market_data import MarketDataFeed, WS_URL
+        from scheduler import BATCH_SIZE, MIN_INTERVAL, PRICE_REQUEST_BUDGET
+
+        feed = None
+        if self.settings.get('market_data', 'poll') == 'stream':
+            feed = MarketDataFeed(list(self.slots), url=self.settings.get('websocket_url', WS_URL),
+                                  jwt_factory=generate_jwt)
+            feed.start()
+        while not self._stop.is_set():
+            product_ids = list(self.slots)
+            try:
+                if feed is not None:
+                    feed.set_products(product_ids)
+                    quotes = feed.drain_updates()
+                else:
+                    quotes = get_price_snapshot(product_ids)
+                for product_id, quote in quotes.items():
+                    self.board.publish(self.slots[product_id], quote)
+            except Exception as e:
+                print(f"Error publishing prices: {e}")
+            if feed is not None:
+                feed.wait_for_prices(self.settings.get('stream_min_interval', 1))
+            else:
+                # One bulk request covers BATCH_SIZE products; stay inside the price budget
+                requests = max(math.ceil(len(product_ids) / BATCH_SIZE), 1)
+                budget = self.settings.get('price_request_budget', PRICE_REQUEST_BUDGET)
+                interval = requests / budget if budget > 0 else 0
+                self._stop.wait(max(self.settings.get('min_poll_interval', MIN_INTERVAL), interval))
+        if feed is not None:
+            feed.stop()
+
+    def handle_report(self, report):
+        from state import store
+
+        shard_id = report['shard']
+        self.latest[shard_id] = report
+        self.load.update(report['load'])
+
+        # A portfolio shard may enable new coins; give them a slot and tell every shard
+        added = [product_id for product_id in report['wanted'] if product_id not in self.slots]
+        for product_id in added:
+            self._slot(product_id)
+        if added:
+            self.assignment.setdefault(shard_id, set()).update(added)
+            for other in self.workers:
+                self._send(other, {'slots': dict(self.slots)})
+
+        if self.by_product:
+            # Keeps the single-process state current, so the bot can be run unsharded again
+            for coin, fields in report['coins'].items():
+                store.update(coin, fields)
+
+    def check_workers(self):
+        now = time.time()
+        for shard_id, worker in self.workers.items():
+            process = worker['process']
+            if process.is_alive():
+                if now - worker['started'] > STABLE_RUNTIME:
+                    worker['delay'] = RESTART_DELAY
+                continue
+            if worker['restart_at'] is None:
+                worker['restart_at'] = now + worker['delay']
+                print(f"Shard {shard_id} exited with code {process.exitcode}, restarting in {worker['delay']}s")
+                worker['delay'] = min(worker['delay'] * 2, MAX_RESTART_DELAY)
+            elif now >= worker['restart_at']:
+                worker['restart_at'] = None
+                worker['restarts'] += 1
+                spec = dict(worker['spec'])
+                if self.by_product:
+                    spec['scope'] = sorted(map(_coin, self.assignment[shard_id]))
+                    spec['seed'] = self.latest.get(shard_id, {}).get('coins', {})
+                self._spawn(shard_id, spec)
+
+    def rebalance(self):
+        if not self.by_product or len(self.assignment) < 2:
+            return []
+        # Products with an unsettled order stay put until it settles
+        locked = {f"{coin}-USD" for report in self.latest.values() for coin in report['open']}
+        weights = {product_id: max(self.load.get(product_id, 0), 1.0)
+                   for products in self.assignment.values() for product_id in products}
+        moves = rebalance(self.assignment, weights, locked)
+        for product_id, source, target in moves:
+            coin = _coin(product_id)
+            state = self.latest.get(source, {}).get('coins', {}).get(coin)
+            self._send(source, {'scope': sorted(map(_coin, self.assignment[source]))})
+            source_history = Path(self.workers[source]['spec']['directory']) / "history"
+            self._send(target, {'scope': sorted(map(_coin, self.assignment[target])),
+                                'import': {coin: state} if state else {},
+                                'adopt': {product_id: str(source_history)}})
+            print(f"Moved {product_id} from shard {source} to shard {target}")
+        self.load.clear()
+        return moves
+
+    def summary(self):
+        shards = {}
+        cash = {}
+        for shard_id, worker in self.workers.items():
+            report = self.latest.get(shard_id, {})
+            coins = report.get('coins', {})
+            value = unrealized = realized = 0.0
+            for fields in coins.values():
+                balance = fields.get('balance', 0) or 0
+                price = fields.get('current_price')
+                cost = fields.get('current_cost_usd', -1)
+                if isinstance(price, (int, float)):
+                    value += balance * price
+                    if cost is not None and cost > 0:
+                        unrealized += (price - cost) * balance
+                realized += fields.get('realized_pnl', 0.0)
+            shards[shard_id] = {
+                'alive': worker['process'].is_alive(),
+                'pid': worker['process'].pid,
+                'restarts': worker['restarts'],
+                'products': len(self.assignment.get(shard_id, ())),
+                'usd_value': value,
+                'unrealized_pnl': unrealized,
+                'realized_pnl': realized,
+                'reported': report.get('time'),
+            }
+            # Shards sharing a key see the same cash; with one key per shard it adds up
+            for currency, balance in report.get('cash', {}).items():
+                cash[currency] = balance if self.by_product else cash.get(currency, 0.0) + balance
+        return {
+            'time': time.time(),
+            'mode': "product" if self.by_product else "portfolio",
+            'shards': shards,
+            'cash': cash,
+            'usd_value': sum(shard['usd_value'] for shard in shards.values()) + sum(cash.values()),
+            'unrealized_pnl': sum(shard['unrealized_pnl'] for shard in shards.values()),
+            'realized_pnl': sum(shard['realized_pnl'] for shard in shards.values()),
+        }
+
+    def write_summary(self, summary):
+        path = self.directory / "summary.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = path.with_suffix(".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(summary, f, indent=2)
+        os.replace(tmp_file, path)
+
+    def start(self):
+        specs = self._specs()
+        self.board = QuoteBoard(self.capacity)
+        threading.Thread(target=self._publish_loop, name="publisher", daemon=True).start()
+        for shard_id, spec in specs.items():
+            self._spawn(shard_id, spec)
+        return self
+
+    def run(self):
+        from state import store
+
+        store.start()
+        self.start()
+        last_rebalance = last_summary = time.time()
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.handle_report(self.reports.get(timeout=1))
+                except queue.Empty:
+                    pass
+                self.check_workers()
+                now = time.time()
+                if now - last_rebalance >= self.rebalance_interval:
+                    self.rebalance()
+                    last_rebalance = now
+                if now - last_summary >= self.report_interval:
+                    summary = self.summary()
+                    self.write_summary(summary)
+                    alive = sum(shard['alive'] for shard in summary['shards'].values())
+                    print(f"{alive}/{len(summary['shards'])} shards up, value ${summary['usd_value']:,.2f}, "
+                          f"unrealized PnL ${summary['unrealized_pnl']:,.2f}, "
+                          f"realized PnL ${summary['realized_pnl']:,.2f}")
+                    last_summary = now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop.set()
+        for worker in self.workers.values():
+            worker['process'].terminate()
+        for worker in self.workers.values():
+            worker['process'].join(5)
+        if self.board is not None:
+            self.board.close()
+            self.board = None
+
+
+def load_keys(path):
+    # A YAML list of {key_name, key_secret} or {key_name, key_secret_file}, one shard each
+    with open(path, "r") as f:
+        keys = yaml.safe_load(f) or []
+    for key in keys:
+        if not key.get('key_name') or not (key.get('key_secret') or key.get('key_secret_file')):
+            raise ValueError(f"Every entry in {path} needs key_name and key_secret or key_secret_file")
+    return keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as several worker processes sharing one price feed")
+    parser.add_argument("--shards", type=int, default=2, help="Workers to split the enabled products across")
+    parser.add_argument("--keys", help="YAML list of API keys; runs one shard per key (portfolio) instead")
+    parser.add_argument("--directory", default=SHARD_DIRECTORY, help="Where each shard keeps its state and history")
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL)
+    parser.add_argument("--rebalance-interval", type=float, default=REBALANCE_INTERVAL)
+    args = parser.parse_args()
+
+    keys = load_keys(args.keys) if args.keys else None
+    if keys and not get_settings().has_credentials:
+        _apply_key(keys[0])  # The supervisor's own price requests use the first key
+        reset_settings()
+    settings = get_settings()
+    if not keys:
+        # The publisher's client reads its limits from settings, so it takes its share the
+        # same way the shards do; the supervisor keeps the full limits to divide them
+        os.environ.update(shared_rates(settings, args.shards))
+        reset_settings()
+    Supervisor(settings, shards=args.shards, keys=keys, directory=args.directory,
+               report_interval=args.report_interval, rebalance_interval=args.rebalance_interval).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import candles
+from history import PriceHistory, CANDLE_DTYPE
+
+
+@pytest.fixture
+def exchange(tmp_path, monkeypatch):
+    # Trades only in every third minute; the rest of the buckets never get a candle
+    store = PriceHistory(tmp_path, dtype=CANDLE_DTYPE, suffix=".1m.candles")
+    requests = []
+
+    def fetch_candles(product_id, start, end, granularity):
+        requests.append((start, end))
+        starts = [timestamp for timestamp in np.arange(start, end, 60) if timestamp % 180 == 0]
+        return np.array([(timestamp, 1.0, 1.0, 1.0, 1.0, 1.0) for timestamp in starts], dtype=CANDLE_DTYPE)
+
+    monkeypatch.setattr(candles, "candle_store", lambda granularity: store)
+    monkeypatch.setattr(candles, "fetch_candles", fetch_candles)
+    monkeypatch.setattr(candles, "_empty", {})
+    return store, requests
+
+
+def test_request_windows_pack_gaps_up_to_the_bucket_limit():
+    gaps = [(0, 60), (120, 180), (300, 900), (1500, 1560)]
+    assert candles.request_windows(gaps, 60, size=10) == [(0, 600), (600, 900), (1500, 1560)]
+
+
+def test_backfill_packs_gaps_and_skips_empty_buckets_next_run(exchange):
+    store, requests = exchange
+    now = 1001 * 60
+
+    # 1001 missing one-minute buckets fit in three windows of at most 350
+    written = candles.backfill_product("SIM-USD", "1m", 0, now=now)
+    assert len(requests) == 3
+    assert written == len(store.series("SIM-USD").all())
+
+    # Only the newest bucket, which may not have been published yet, is asked for again
+    requests.clear()
+    assert candles.backfill_product("SIM-USD", "1m", 0, now=now) == 0
+    assert requests == [(now - 60, now)]
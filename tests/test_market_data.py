@@ -0,0 +1,75 @@
+import time
+import pytest
+from market_data import MarketDataFeed
+from ws_simulator import MarketDataSimulator
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def simulator():
+    simulator = MarketDataSimulator(coins=3, interval=0.02, seed=1).start()
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def feed(simulator):
+    feed = MarketDataFeed(["SIM0-USD", "SIM1-USD"], url=simulator.url, reconnect_delay=0.05)
+    feed.start()
+    yield feed
+    feed.stop()
+
+
+def ticker_subscriptions(simulator, message_type="subscribe"):
+    return [message for message in simulator.messages
+            if message['type'] == message_type and message['channel'] == "ticker"]
+
+
+def test_subscribe_receives_snapshot_and_updates(simulator, feed):
+    assert feed.wait_for_prices(5)
+    assert wait_until(lambda: set(feed.snapshot()) == {"SIM0-USD", "SIM1-USD"})
+    assert ticker_subscriptions(simulator)[0]['product_ids'] == ["SIM0-USD", "SIM1-USD"]
+    assert wait_until(lambda: any(message['channel'] == "heartbeats" for message in simulator.messages))
+
+    quote = feed.snapshot()["SIM0-USD"]
+    assert quote['bid'] < quote['ask']
+    assert quote['price'] == quote['bid']
+    assert wait_until(lambda: simulator.stats['update'] > 0 and feed.stats['messages'] > 2)
+
+
+def test_sequence_gap_resubscribes(simulator, feed):
+    assert wait_until(lambda: feed.stats['messages'] > 2)
+    simulator.skip_sequence()
+    assert wait_until(lambda: feed.stats['resubscribes'] == 1)
+    assert feed.stats['sequence_gaps'] == 1
+    # The resubscribe drops the old subscription first, then asks for a fresh snapshot
+    assert wait_until(lambda: len(ticker_subscriptions(simulator)) == 2)
+    assert ticker_subscriptions(simulator, "unsubscribe")[0]['product_ids'] == ["SIM0-USD", "SIM1-USD"]
+    assert wait_until(lambda: simulator.stats['snapshot'] == 2)
+
+
+def test_product_change_resubscribes(simulator, feed):
+    assert wait_until(lambda: feed.stats['messages'] > 0)
+    feed.set_products(["SIM2-USD"])
+    assert wait_until(lambda: "SIM2-USD" in feed.snapshot())
+    assert ticker_subscriptions(simulator)[-1]['product_ids'] == ["SIM2-USD"]
+
+
+def test_reconnects_after_connection_drop(simulator, feed):
+    assert wait_until(lambda: feed.stats['connects'] == 1 and feed.stats['messages'] > 0)
+    simulator.drop_connections()
+    assert wait_until(lambda: feed.stats['connects'] == 2)
+    assert wait_until(lambda: simulator.stats['connects'] == 2)
+    # A new connection starts its own sequence, which must not count as a gap
+    assert wait_until(lambda: len(ticker_subscriptions(simulator)) == 2)
+    feed.drain_updates()
+    assert feed.wait_for_prices(5)
+    assert feed.stats['sequence_gaps'] == 0
@@ -0,0 +1,83 @@
+import pytest
+import orders
+from orders import OrderTracker
+from state import StateStore
+
+
+class FakeExchange:
+    def __init__(self):
+        self.orders = {}
+        self.balances = {}
+
+    def fetch_orders(self, order_ids):
+        return [self.orders[order_id] for order_id in order_ids if order_id in self.orders]
+
+    def cancel_orders(self, order_ids):
+        return {order_id: True for order_id in order_ids}
+
+    def synced_balance(self, coin):
+        return self.balances.get(coin)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = StateStore(snapshot_file=tmp_path / "state.json", yaml_file=tmp_path / "coins_settings.yaml")
+    monkeypatch.setattr(orders, "store", store)
+    return store
+
+
+@pytest.fixture
+def exchange():
+    return FakeExchange()
+
+
+def filled(order_id, size, price):
+    return {'order_id': order_id, 'status': 'FILLED', 'filled_size': str(size),
+            'average_filled_price': str(price), 'total_fees': "0"}
+
+
+@pytest.mark.parametrize("synced_first", [False, True])
+def test_buy_fill_averages_cost_whichever_sees_it_first(store, exchange, synced_first):
+    store.update("BTC", balance=1.0, current_cost_usd=100.0)
+    exchange.balances["BTC"] = 1.0
+    tracker = OrderTracker(exchange.fetch_orders, exchange.cancel_orders, exchange.synced_balance)
+    tracker.track("order-1", "BTC-USD", "BUY", "BTC")
+
+    exchange.orders["order-1"] = filled("order-1", 1.0, 200.0)
+    if synced_first:
+        # The account sync picked up the new balance before the status poll did
+        exchange.balances["BTC"] = 2.0
+        store.update("BTC", balance=2.0)
+    tracker.poll()
+
+    assert store.get("BTC")['balance'] == pytest.approx(2.0)
+    assert store.get("BTC")['current_cost_usd'] == pytest.approx(150.0)
+
+
+def test_full_sell_leaving_dust_closes_the_position(store, exchange):
+    store.update("BTC", balance=0.123456789, current_cost_usd=100.0)
+    exchange.balances["BTC"] = 0.123456789
+    tracker = OrderTracker(exchange.fetch_orders, exchange.cancel_orders, exchange.synced_balance,
+                           product_info=lambda product_id: {'base_increment': "0.00000001"})
+    tracker.track("order-1", "BTC-USD", "SELL", "BTC")
+
+    # The sell size was floored to the increment, so 9e-10 is left behind
+    exchange.orders["order-1"] = filled("order-1", 0.12345678, 120.0)
+    tracker.poll()
+
+    assert store.get("BTC")['balance'] == 0.0
+    assert store.get("BTC")['current_cost_usd'] == -1
+
+
+def test_cancel_order_shares_the_batch_and_returns_its_result(store, exchange, monkeypatch):
+    import coinbase
+
+    batches = []
+    tracker = OrderTracker(exchange.fetch_orders, lambda order_ids: batches.append(sorted(order_ids)) or
+                           {order_id: order_id != "order-2" for order_id in order_ids}, exchange.synced_balance)
+    monkeypatch.setattr(orders, "order_tracker", tracker)
+    tracker.request_cancel("order-1")
+
+    assert coinbase.cancel_order("order-2") is False
+    assert coinbase.cancel_order("order-3") is True
+    assert batches == [["order-1", "order-2"], ["order-3"]]
@@ -0,0 +1,61 @@
+import threading
+import pytest
+import state
+from state import StateStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StateStore(snapshot_file=tmp_path / "state.json", yaml_file=tmp_path / "coins_settings.yaml")
+
+
+def reload(store):
+    return StateStore(snapshot_file=store.snapshot_file, yaml_file=store.yaml_file)
+
+
+def test_failed_flush_keeps_changes_for_the_next_one(store, monkeypatch):
+    store.update("BTC", balance=1.0)
+
+    def full_disk(path, *args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(state, "open", full_disk, raising=False)
+    with pytest.raises(OSError):
+        store.flush()
+    monkeypatch.undo()
+
+    store.flush()
+    assert reload(store).get("BTC") == {'balance': 1.0}
+
+
+def test_close_never_writes_alongside_the_flush_thread(store, monkeypatch):
+    writing = threading.Event()
+    release = threading.Event()
+    active = []
+    overlapped = []
+    real_replace = state.os.replace
+
+    def slow_replace(source, destination):
+        overlapped.append(len(active))
+        active.append(source)
+        if not writing.is_set():
+            writing.set()
+            release.wait(5)  # The flush thread's write is still in progress
+        real_replace(source, destination)
+        active.pop()
+
+    monkeypatch.setattr(state.os, "replace", slow_replace)
+    store.flush_interval = 0.01
+    store.update("BTC", balance=1.0)
+    store.start()
+    assert writing.wait(5)
+    store.update("ETH", balance=2.0)
+
+    closer = threading.Thread(target=store.close)
+    closer.start()
+    closer.join(0.2)
+    release.set()
+    closer.join(5)
+    assert not closer.is_alive()
+    assert not any(overlapped)
+    assert reload(store).get("ETH") == {'balance': 2.0}
@@ -1,31 +1,143 @@
+import asyncio
 import time
-from config import load_coins_settings, update_coins_settings, load_trends, save_trends, load_settings
-from coinbase import get_current_price
-from selling import check_sell_opportunities
-from buying import check_buy_opportunities
+from history import history
+from candles import aggregator
+from state import store
+from selling import sell_coin
+from buying import buy_coin, BUY_INTERVAL
+from ratelimit import TokenBucket
+from trends import check_price_trends as update_trends
+from coinbase import observe_quotes, quote_price
+from indicators import get_engine
+from scheduler import CoinScheduler, volatility_of, MIN_INTERVAL, MAX_INTERVAL, PRICE_REQUEST_BUDGET
+from orders import settle_orders, order_tracker
+from signals import pack_universe, evaluate_signals
+from metrics import timer, end_cycle
 
-def check_price_trends():
+SCHEDULER_WAKE_INTERVAL = 1  # Longest sleep between scheduler passes, in seconds
+MAX_BUYS_PER_MINUTE = 10  # Buy orders across all coins, however fast prices arrive
+
+def record_prices(quotes):
+    with timer('autocoin_phase_seconds', phase="history"):
+        for product_id, quote in quotes.items():
+            history.append_quote(product_id, quote)
+    with timer('autocoin_phase_seconds', phase="candles"):
+        aggregator.add_quotes(quotes)
+    with timer('autocoin_phase_seconds', phase="trends"):
+        update_trends(quotes)
+
+async def poll_prices(client, product_ids):
+    with timer('autocoin_phase_seconds', phase="fetch_prices"):
+        quotes = await client.get_price_snapshot(product_ids)
+    record_prices(quotes)
+    return quotes
+
+def poll_interval(scheduler, product_id, quote, settings):
+    coin = product_id.split("-")[0]
+    details = store.get(coin, {})
+    price = quote_price(quote)
+    engine = get_engine(product_id)
+    bollinger = engine.bollinger()
+    volatility = volatility_of(bollinger[3] if bollinger else None, price, engine.bollinger_window)
+    return scheduler.interval_for(price, details.get('current_cost_usd'), details.get('balance', 0),
+                                  details.get('sale_threshold', settings.get('sale_threshold', 10)),
+                                  details.get('loss_limit', settings.get('loss_limit')), volatility)
+
+async def schedule_prices(client, evaluations, settings, scheduler=None):
+    # Each coin is polled when its own timer comes due: often near a threshold or in a
+    # volatile market, rarely when quiet or flat, all within the price request budget
+    if scheduler is None:
+        scheduler = CoinScheduler(settings['refresh_interval'],
+                                  min_interval=settings.get('min_poll_interval', MIN_INTERVAL),
+                                  max_interval=settings.get('max_poll_interval', MAX_INTERVAL),
+                                  request_budget=settings.get('price_request_budget', PRICE_REQUEST_BUDGET))
     while True:
-        coins_settings = load_coins_settings()
+        scheduler.set_products([f"{coin}-USD" for coin in store.enabled_coins()])
+        due = scheduler.pop_due()
+        if due:
+            try:
+                quotes = await poll_prices(client, due)
+                for product_id in due:
+                    scheduler.reschedule(product_id, poll_interval(scheduler, product_id, quotes.get(product_id),
+                                                                   settings))
+                evaluations.put_nowait(quotes)
+            except Exception as e:
+                print(f"Error updating price trends: {e}")
+                for product_id in due:
+                    scheduler.reschedule(product_id, scheduler.base_interval)
+        # Wake at least once a second so newly enabled coins are picked up promptly
+        await asyncio.sleep(scheduler.wait_time(limit=SCHEDULER_WAKE_INTERVAL))
+
+async def check_price_trends(client, evaluations, settings, feed=None):
+    if feed is None:
+        await schedule_prices(client, evaluations, settings)
+        return
 
-        for coin, settings in coins_settings.items():
-            if settings['enabled']:
-                current_price = get_current_price(f"{coin}-USD")
-                previous_price = settings['previous_price']
-                price_trends = load_trends(coin)
+    last_poll = 0
+    while True:
+        product_ids = [f"{coin}-USD" for coin in store.enabled_coins()]
 
-                if previous_price:
-                    price_change = (current_price - previous_price) / previous_price
-                    price_trends.append(price_change)
-                    price_trends = price_trends[-10:]  # Keep only the last 10 trends
+        try:
+            # Only products that ticked since the last pass are evaluated; anything the
+            # stream has not priced recently is polled over REST once per refresh_interval
+            feed.set_products(product_ids)
+            updated = feed.drain_updates()
+            if time.time() - last_poll >= settings['refresh_interval']:
+                streamed = feed.snapshot(product_ids)
+                missing = [product_id for product_id in product_ids
+                           if product_id not in streamed and product_id not in updated]
+                if missing:
+                    with timer('autocoin_phase_seconds', phase="fetch_prices"):
+                        updated.update(await client.get_price_snapshot(missing))
+                last_poll = time.time()
 
-                    trend_status = "upward" if price_change > 0 else "downward"
-                    coins_settings[coin]['trend_status'] = trend_status
+            observe_quotes(updated)
+            record_prices(updated)
+            evaluations.put_nowait(updated)
+        except Exception as e:
+            print(f"Error updating price trends: {e}")
 
-                save_trends(coin, price_trends)
-                settings['previous_price'] = current_price
+        # Fire on the next price event, but no more often than stream_min_interval
+        await asyncio.sleep(settings.get('stream_min_interval', 1))
+        await feed.next_prices(settings['refresh_interval'])
+
+def buy_budget(settings):
+    per_minute = settings.get('max_buys_per_minute', MAX_BUYS_PER_MINUTE)
+    if not per_minute:
+        return None
+    return TokenBucket(per_minute / 60, burst=max(per_minute, 1))
+
+async def execute_orders(client, orders, buy_interval=BUY_INTERVAL, budget=None):
+    # Sells go out first so their proceeds are there for the buys
+    await asyncio.gather(*(sell_coin(client, order['coin']) for order in orders if order['side'] == 'SELL'))
+    await asyncio.gather(*(buy_coin(client, order['coin'], order['usd_order_size'], current_price=order['current_price'],
+                                    buy_interval=buy_interval, budget=budget)
+                           for order in orders if order['side'] == 'BUY'))
+
+async def evaluate(client, quotes, settings, budget=None):
+    with timer('autocoin_phase_seconds', phase="evaluate"):
+        with timer('autocoin_phase_seconds', phase="settle_orders"):
+            await settle_orders(client)
+        with timer('autocoin_phase_seconds', phase="signals"):
+            universe = pack_universe(store.coins(), quotes, settings, order_tracker.open_sides())
+            orders = evaluate_signals(universe)
+        with timer('autocoin_phase_seconds', phase="execute"):
+            await execute_orders(client, orders, settings.get('buy_interval', BUY_INTERVAL), budget)
+    end_cycle()
+    return orders
+
+async def evaluate_opportunities(client, evaluations, settings):
+    # In stream mode a pass can run every stream_min_interval, so buys across the whole
+    # portfolio share one budget instead of following the price events
+    budget = buy_budget(settings)
+    while True:
+        quotes = await evaluations.get()
+        # Prices that queued up while the last round of orders was in flight are merged,
+        # so decisions are made on the newest quote per product
+        while not evaluations.empty():
+            quotes.update(evaluations.get_nowait())
 
-        update_coins_settings(coins_settings)
-        check_sell_opportunities()
-        check_buy_opportunities()
-        time.sleep(load_settings()['refresh_interval'])
+        try:
+            await evaluate(client, quotes, settings, budget)
+        except Exception as e:
+            print(f"Error evaluating buy/sell opportunities: {e}")
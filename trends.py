@@ -1,57 +1,47 @@
-from coinbase import get_current_price
-from config import load_coins_settings, update_coins_settings
-import numpy as np
-
-coins_settings = load_coins_settings()
-
-def calculate_sma(prices, window):
-    if len(prices) < window:
-        return None  # Not enough data to calculate SMA
-    return np.mean(prices[-window:])
-    
-def check_price_trends():
-    short_term_window = 10
-    long_term_window = 30 
-    
+from coinbase import get_price_snapshot, quote_price
+from indicators import get_engine
+from state import store
+from metrics import timer
+
+def check_price_trends(quotes=None):
+    coins_settings = store.coins()
+    if quotes is None:
+        quotes = get_price_snapshot([f"{coin}-USD" for coin, details in coins_settings.items()
+                                     if details.get('enabled', False)])
+
+    signals = {}
     for coin, details in coins_settings.items():
-        if details.get('enabled', False):
+        if details.get('enabled', False) and f"{coin}-USD" in quotes:
             previous_price = details.get('previous_price')
-            current_price = get_current_price(f"{coin}-USD")
+            current_price = quote_price(quotes.get(f"{coin}-USD"))
             balance = details.get('balance', 0)
-            current_cost_usd = details.get('current_cost_usd', -1)
 
             if current_price is not None:
-                details['prices'].append(current_price)
-                if previous_price is not None:
-                    price_change = (current_price - previous_price) / previous_price
-                else:
-                    price_change = 0
-
-                details['price_trends'].append(price_change)
-                if len(details['price_trends']) > short_term_window:
-                    details['price_trends'].pop(0)
-
-                details['previous_price'] = current_price
-                details['current_price'] = current_price
-                details['usd_value'] = current_price * balance
-
-                # Calculate SMA
-                details['sma_short_term'] = calculate_sma(details['prices'], short_term_window)
-                details['sma_long_term'] = calculate_sma(details['prices'], long_term_window)
-
-                # Determine trend status using SMA
-                if details['sma_short_term'] and details['sma_long_term']:
-                    if details['sma_short_term'] > details['sma_long_term']:
-                        trend_status = 'upward'
-                    elif details['sma_short_term'] < details['sma_long_term']:
-                        trend_status = 'downward'
+                with timer('autocoin_indicator_update_seconds'):
+                    indicators = get_engine(f"{coin}-USD").update(current_price)
+
+                # Determine trend status using the SMA crossover, falling back to the
+                # last price change until the long window has filled
+                trend_status = indicators['trend']
+                if trend_status is None:
+                    if previous_price:
+                        trend_status = "upward" if current_price > previous_price else "downward"
                     else:
                         trend_status = 'stable'
-                else:
-                    trend_status = 'stable'
 
-                details['trend_status'] = trend_status
-                
-                update_coins_settings(coins_settings)
-            else:
-                print(f"Could not retrieve current price for {coin}. Skipping...")
+                if indicators['crossover']:
+                    print(f"{coin}: {indicators['crossover']} cross, short SMA {indicators['sma_short_term']:.8g} "
+                          f"vs long SMA {indicators['sma_long_term']:.8g}")
+
+                store.update(coin, {
+                    'previous_price': current_price,
+                    'current_price': current_price,
+                    'usd_value': current_price * balance,
+                    'sma_short_term': indicators['sma_short_term'],
+                    'sma_long_term': indicators['sma_long_term'],
+                    'rsi': indicators['rsi'],
+                    'macd': indicators['macd'],
+                    'trend_status': trend_status,
+                })
+                signals[coin] = indicators
+    return signals
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+
+class MarketDataSimulator:
+    # Local stand-in for the Advanced Trade market data WebSocket: ticker snapshots on
+    # subscribe, a random-walk update stream, and hooks to force a sequence gap or drop
+    # every connection, so MarketDataFeed can be exercised without the exchange
+    def __init__(self, coins=10, interval=0.05, volatility=0.002, seed=None, host="127.0.0.1", port=0):
+        self.interval = interval
+        self.volatility = volatility
+        self.random = random.Random(seed)
+        self.prices = {f"SIM{index}-USD": self.random.uniform(1, 1000) for index in range(coins)}
+        self.host = host
+        self.port = port
+        self.messages = []  # Every subscribe and unsubscribe received, in order
+        self.stats = Counter()
+        self._connections = set()
+        self._skip = 0
+        self._loop = None
+        self._stopped = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def _tickers(self, product_ids, move):
+        tickers = []
+        for product_id in sorted(product_ids):
+            if product_id not in self.prices:
+                continue
+            if move:
+                self.prices[product_id] *= math.exp(self.random.gauss(0, self.volatility))
+            price = self.prices[product_id]
+            tickers.append({'type': "ticker", 'product_id': product_id, 'price': str(price),
+                            'best_bid': str(price * 0.9995), 'best_ask': str(price * 1.0005)})
+        return tickers
+
+    async def _send(self, connection, event_type, product_ids, move=False):
+        tickers = self._tickers(product_ids, move)
+        if not tickers:
+            return
+        sequence = connection['sequence'] + self._skip
+        self._skip = 0
+        connection['sequence'] = sequence + 1
+        await connection['websocket'].send(json.dumps({
+            'channel': "ticker",
+            'client_id': "",
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            'sequence_num': sequence,
+            'events': [{'type': event_type, 'tickers': tickers}],
+        }))
+        self.stats[event_type] += 1
+
+    async def _stream(self, connection):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._send(connection, "update", connection['products'], move=True)
+
+    async def _handle(self, websocket):
+        self.stats['connects'] += 1
+        connection = {'websocket': websocket, 'sequence': 0, 'products': set()}
+        self._connections.add(websocket)
+        streamer = asyncio.create_task(self._stream(connection))
+        try:
+            async for raw in websocket:
+                message = json.loads(raw)
+                self.messages.append(message)
+                self.stats[message.get('type')] += 1
+                if message.get('channel') != "ticker":
+                    continue  # Heartbeats are accepted but not simulated
+                product_ids = set(message.get('product_ids', []))
+                if message.get('type') == "subscribe":
+                    connection['products'] |= product_ids
+                    await self._send(connection, "snapshot", product_ids)
+                elif message.get('type') == "unsubscribe":
+                    connection['products'] -= product_ids
+        except ConnectionClosed:
+            pass
+        finally:
+            streamer.cancel()
+            self._connections.discard(websocket)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        async with serve(self._handle, self.host, self.port) as server:
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stopped.wait()
+
+    def skip_sequence(self, count=5):
+        # The next message jumps this many sequence numbers ahead, as if frames were lost
+        self._skip = count
+
+    def drop_connections(self):
+        async def close_all():
+            for websocket in list(self._connections):
+                await websocket.close(code=1011, reason="simulated outage")
+
+        asyncio.run_coroutine_threadsafe(close_all(), self._loop).result(5)
+
+    def start(self):
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        if self._thread is not None:
+            self._thread.join(5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Advanced Trade market data WebSocket stand-in")
+    parser.add_argument("--coins", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between ticker updates")
+    args = parser.parse_args()
+
+    simulator = MarketDataSimulator(coins=args.coins, interval=args.interval, port=args.port).start()
+    print(f"Streaming {args.coins} products at {simulator.url}")
+    print("Point settings.yaml at it with market_data: stream and websocket_url")
+    try:
+        simulator._thread.join()
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()